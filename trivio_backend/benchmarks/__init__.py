@@ -0,0 +1,38 @@
+"""Micro-benchmarks of the backend. Run from the directory of `manage.py`, e.g.:
+
+    python -m benchmarks.jwt_auth
+
+Every benchmark works with a fresh temporary database, like the tests do.
+"""
+import contextlib
+import os
+import time
+
+import django
+
+# settings can be tweaked by a benchmark before `setup_django()`
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trivio_backend.settings')
+
+
+def setup_django():
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.test.utils import setup_databases, teardown_databases
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+@contextlib.contextmanager
+def timer(results, name):
+    started = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - started
@@ -0,0 +1,77 @@
+"""Throughput of `manage.py import_jsonl` as the tables grow: rows/s of every batch of likes
+must stay flat, a batch costs the same regardless of how many rows were imported before it
+"""
+import json
+import os
+import random
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks import setup_django, test_database
+
+NUM_USERS = 2000
+NUM_POSTS = 20000
+NUM_LIKES = 300000
+BATCH_SIZE = 5000
+REPORT_EVERY = 50000
+
+
+def write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as output:
+        for row in rows:
+            output.write(json.dumps(row) + "\n")
+
+
+def main(directory):
+    from django.core.management import call_command
+
+    from trivio_backend.core import bulk_import, response_cache
+
+    rnd = random.Random(42)
+    users_path, posts_path = os.path.join(directory, "users.jsonl"), os.path.join(directory, "posts.jsonl")
+    write_jsonl(users_path, (
+        {"username": f"user{i}", "email": f"user{i}@example.com", "password": "secret"} for i in range(NUM_USERS)
+    ))
+    write_jsonl(posts_path, (
+        {"id": i + 1, "username": f"user{rnd.randrange(NUM_USERS)}", "title": "title", "content": "content"}
+        for i in range(NUM_POSTS)
+    ))
+    started = time.perf_counter()
+    call_command("import_jsonl", users=users_path, posts=posts_path, batch_size=BATCH_SIZE, stdout=StringIO())
+    print(f"{NUM_USERS} users and {NUM_POSTS} posts imported in {time.perf_counter() - started:.1f} s")
+
+    generation = response_cache.get_generation(response_cache.POSTS_GENERATION)
+    edges = set()
+    rates = []
+    elapsed = 0.0
+    while len(edges) < NUM_LIKES:
+        batch = []
+        while len(batch) < BATCH_SIZE:
+            # a few posts get most of the likes
+            edge = (int(rnd.paretovariate(0.8)) % NUM_POSTS + 1, f"user{rnd.randrange(NUM_USERS)}")
+            if edge not in edges:
+                edges.add(edge)
+                batch.append({"post_id": edge[0], "username": edge[1]})
+        started = time.perf_counter()
+        bulk_import.import_likes(batch)
+        batch_elapsed = time.perf_counter() - started
+        elapsed += batch_elapsed
+        rates.append(len(batch) / batch_elapsed)
+        if len(edges) % REPORT_EVERY == 0:
+            print(
+                f"{len(edges):>8} likes: {len(edges) / elapsed:7.0f} rows/s overall, "
+                f"{rates[-1]:7.0f} rows/s of the last batch"
+            )
+
+    num_batches = len(rates)
+    # one bump of the cached responses per batch
+    assert response_cache.get_generation(response_cache.POSTS_GENERATION) == generation + num_batches
+    first, last = rates[:num_batches // 10], rates[-(num_batches // 10):]
+    print(f"last batches are {sum(first) / sum(last):.2f}x slower than the first ones")
+
+
+if __name__ == "__main__":
+    setup_django()
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        main(directory)
@@ -0,0 +1,53 @@
+"""Bytes on the wire and encode CPU time of a posts page for every format and compression
+"""
+import random
+import time
+
+from benchmarks import setup_django
+
+PAGE_SIZE = 20
+CONTENT_SIZES = (200, 2000, 32000)
+NUM_REPEATS = 50
+WORDS = "the a social network post like trivial friend today weather coffee cat dog walk moscow".split()
+
+
+def get_page(rnd, content_size):
+    from datetime import datetime, timezone
+
+    from trivio_backend.core.views.posts import PostRow, serialize_post_rows
+
+    rows = []
+    for i in range(PAGE_SIZE):
+        content = ""
+        while len(content) < content_size:
+            content += rnd.choice(WORDS) + " "
+        rows.append(PostRow(
+            i, rnd.randint(1, 1000), rnd.randint(0, 100), datetime.now(timezone.utc), content, "title",
+        ))
+    return {"next": "MjAxOS0wOS0wMVQxMDowMDowMCswMDowMHw0Mg", "previous": None, "results": serialize_post_rows(rows)}
+
+
+def main():
+    from rest_framework.renderers import JSONRenderer
+
+    from trivio_backend.core.middleware import compress
+    from trivio_backend.core.renderers import MessagePackRenderer
+
+    rnd = random.Random(42)
+    for content_size in CONTENT_SIZES:
+        page = get_page(rnd, content_size)
+        print(f"page of {PAGE_SIZE} posts, {content_size} bytes of content each:")
+        for renderer in (JSONRenderer(), MessagePackRenderer()):
+            for encoding in (None, "gzip", "br"):
+                started = time.perf_counter()
+                for _ in range(NUM_REPEATS):
+                    body = renderer.render(page)
+                    if encoding is not None:
+                        body = compress(body, encoding)
+                elapsed = (time.perf_counter() - started) / NUM_REPEATS
+                print(f"{renderer.format:>10} {encoding or 'identity':>9}: {len(body):8} bytes, {elapsed * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    setup_django()
+    main()
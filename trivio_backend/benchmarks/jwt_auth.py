@@ -0,0 +1,43 @@
+"""Queries and time per authenticated request: simplejwt `JWTAuthentication` vs `CachedJWTAuthentication`
+"""
+from benchmarks import setup_django, test_database, timer
+
+NUM_REQUESTS = 1000
+
+
+def main():
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from trivio_backend.core import models
+    from trivio_backend.core.authentication import CachedJWTAuthentication
+
+    user = models.User.objects.create(username="me", email="me@example.com")
+    header = f"Bearer {RefreshToken.for_user(user).access_token}"
+    factory = APIRequestFactory()
+    requests = [
+        APIView().initialize_request(factory.post("/api/v1/posts/1/like/", HTTP_AUTHORIZATION=header))
+        for _ in range(NUM_REQUESTS)
+    ]
+
+    timings = {}
+    for auth_class in (JWTAuthentication, CachedJWTAuthentication):
+        authentication = auth_class()
+        with CaptureQueriesContext(connection) as queries, timer(timings, auth_class.__name__):
+            for request in requests:
+                authenticated_user, _ = authentication.authenticate(request)
+                assert authenticated_user.id == user.id
+        print(
+            f"{auth_class.__name__:>24}: {len(queries) / NUM_REQUESTS:.3f} queries/request, "
+            f"{timings[auth_class.__name__] / NUM_REQUESTS * 1e6:.0f} us/request"
+        )
+
+
+if __name__ == "__main__":
+    setup_django()
+    with test_database():
+        main()
@@ -0,0 +1,37 @@
+"""Mixed read/write throughput with and without a read replica.
+
+Both databases are SQLite files in a temporary directory, the replica is a snapshot copy
+of the primary, which is enough to measure the effect of moving reads off the primary file.
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+from benchmarks import setup_django, workload
+
+
+def main():
+    db_dir = tempfile.mkdtemp()
+    try:
+        primary = os.path.join(db_dir, "primary.sqlite3")
+        replica = os.path.join(db_dir, "replica.sqlite3")
+        workload.configure(primary)
+        from django.conf import settings
+        settings.DATABASES["replica"] = dict(settings.DATABASES["default"], NAME=replica)
+        setup_django()
+        # server errors are counted, no need in their tracebacks
+        logging.disable(logging.CRITICAL)
+
+        users = workload.populate()
+        shutil.copy(primary, replica)
+        for replicas in ([], ["replica"]):
+            settings.DATABASE_REPLICAS = replicas
+            throughput, errors = workload.run(users)
+            print(f"replicas={replicas!s:<12} {throughput:8.1f} requests/s, {errors} errors")
+    finally:
+        shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main()
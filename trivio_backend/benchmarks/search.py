@@ -0,0 +1,65 @@
+"""Full-text search of posts on a generated corpus: FTS5 index vs `icontains` scans.
+
+Scans of frequent words stop at the first page, as they don't rank anything, while FTS5 ranks
+all the matches. Rare words and several words are where the scans read the whole table.
+"""
+import random
+
+from benchmarks import setup_django, test_database, timer
+
+NUM_POSTS = 20000
+WORDS_PER_POST = (20, 2000)
+VOCABULARY_SIZE = 5000
+QUERIES = ["w17", "w42 w4242", "w999", "w3"]
+NUM_REPEATS = 20
+PAGE_SIZE = 20
+
+
+def main():
+    from django.db import transaction
+    from django.db.models import Q
+
+    from trivio_backend.core import models
+    from trivio_backend.core.search import search_posts
+
+    rnd = random.Random(42)
+    vocabulary = [f"w{i}" for i in range(VOCABULARY_SIZE)]
+    user = models.User.objects.create(username="me", email="me@example.com")
+    posts = [
+        models.Post(
+            user=user,
+            title=" ".join(rnd.choices(vocabulary, k=5)),
+            # zipf-like distribution: a few words are frequent, most of them are rare
+            content=" ".join(
+                vocabulary[int(rnd.paretovariate(1.0)) % VOCABULARY_SIZE]
+                for _ in range(rnd.randint(*WORDS_PER_POST))
+            ),
+        )
+        for _ in range(NUM_POSTS)
+    ]
+    timings = {}
+    with timer(timings, "insert"), transaction.atomic():
+        models.Post.objects.bulk_create(posts)
+    print(f"{NUM_POSTS} posts inserted and indexed in {timings['insert']:.1f} s")
+
+    for query in QUERIES:
+        with timer(timings, "fts"):
+            for _ in range(NUM_REPEATS):
+                fts_ids = list(search_posts(models.Post.objects, query).values_list("id", flat=True)[:PAGE_SIZE])
+        words = Q()
+        for word in query.split():
+            words &= Q(title__icontains=word) | Q(content__icontains=word)
+        with timer(timings, "icontains"):
+            for _ in range(NUM_REPEATS):
+                # no relevance at all, and substrings match too ("w17" matches "w170")
+                scan_ids = list(models.Post.objects.filter(words).values_list("id", flat=True)[:PAGE_SIZE])
+        print(
+            f"{query!r:>14}: fts {timings['fts'] / NUM_REPEATS * 1e3:7.2f} ms/query ({len(fts_ids)} results), "
+            f"icontains {timings['icontains'] / NUM_REPEATS * 1e3:7.2f} ms/query ({len(scan_ids)} results)"
+        )
+
+
+if __name__ == "__main__":
+    setup_django()
+    with test_database():
+        main()
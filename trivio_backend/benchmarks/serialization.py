@@ -0,0 +1,45 @@
+"""Time to read and serialize 1k posts: `PostSerializer` over model instances vs `values_list` rows
+"""
+from benchmarks import setup_django, test_database, timer
+
+NUM_POSTS = 1000
+NUM_REPEATS = 20
+
+
+def main():
+    from trivio_backend.core import models
+    from trivio_backend.core.views.posts import PostSerializer, get_post_rows, serialize_post_rows
+
+    user = models.User.objects.create(username="me", email="me@example.com")
+    models.Post.objects.bulk_create(
+        [models.Post(user=user, title=f"title {i}", content="content " * 50) for i in range(NUM_POSTS)]
+    )
+    queryset = models.Post.objects.order_by("-timestamp", "-id")
+    posts, rows = list(queryset), get_post_rows(queryset)
+
+    timings = {}
+    with timer(timings, "serializer fetch"):
+        for _ in range(NUM_REPEATS):
+            list(queryset.all())
+    with timer(timings, "serializer serialize"):
+        for _ in range(NUM_REPEATS):
+            PostSerializer(posts, many=True).data
+    with timer(timings, "rows fetch"):
+        for _ in range(NUM_REPEATS):
+            get_post_rows(queryset)
+    with timer(timings, "rows serialize"):
+        for _ in range(NUM_REPEATS):
+            serialize_post_rows(rows)
+
+    for name in ("serializer", "rows"):
+        fetch, serialize = timings[f"{name} fetch"] / NUM_REPEATS, timings[f"{name} serialize"] / NUM_REPEATS
+        print(
+            f"{name:>10}: fetch {fetch * 1e3:6.2f} ms, serialize {serialize * 1e3:6.2f} ms, "
+            f"total {(fetch + serialize) * 1e3:6.2f} ms per {NUM_POSTS} posts"
+        )
+
+
+if __name__ == "__main__":
+    setup_django()
+    with test_database():
+        main()
@@ -0,0 +1,72 @@
+"""Signup throughput and statements per signup: the former check-then-insert path vs `auth_signup`
+"""
+from benchmarks import setup_django, test_database, timer
+
+NUM_SIGNUPS = 200
+HASHERS = (
+    # the default one, its cost dominates
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    # fast one shows the database part of the signup
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+)
+
+
+def legacy_signup(data):
+    """The signup before the single INSERT: existence check, INSERT, hashing and UPDATE of the whole user
+    """
+    from django.db.models import Q
+
+    from trivio_backend.core import models
+    from trivio_backend.core.jobs import enqueue
+    from trivio_backend.core.tasks import verify_new_user
+
+    if models.User.objects.filter(Q(username=data["username"]) | Q(email=data["email"])).exists():
+        return
+    user = models.User.objects.create(
+        email=data["email"],
+        username=data["username"],
+        verification_state=models.User.VERIFICATION_PENDING,
+    )
+    user.set_password(data["password"])
+    user.save()
+    enqueue(verify_new_user, user_id=user.id)
+
+
+def main():
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory
+
+    from trivio_backend.core import models
+    from trivio_backend.core.views.auth import auth_signup
+
+    factory = APIRequestFactory()
+
+    def new_signup(data):
+        response = auth_signup(factory.post("/api/v1/auth/signup/", data, format="json"))
+        assert response.status_code == 201, response.data
+
+    timings = {}
+    for hasher in HASHERS:
+        for name, signup in (("legacy", legacy_signup), ("single insert", new_signup)):
+            models.Job.objects.all().delete()
+            models.User.objects.all().delete()
+            users = [
+                {"username": f"user{i}", "email": f"user{i}@example.com", "password": "qwerty"}
+                for i in range(NUM_SIGNUPS)
+            ]
+            with override_settings(PASSWORD_HASHERS=[hasher]), CaptureQueriesContext(connection) as queries, \
+                    timer(timings, name):
+                for data in users:
+                    signup(data)
+            print(
+                f"{hasher.rsplit('.', 1)[1]:>20} {name:>14}: {NUM_SIGNUPS / timings[name]:8.1f} signups/s, "
+                f"{len(queries) / NUM_SIGNUPS:.1f} statements/signup"
+            )
+
+
+if __name__ == "__main__":
+    setup_django()
+    with test_database():
+        main()
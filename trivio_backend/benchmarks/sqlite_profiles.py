@@ -0,0 +1,38 @@
+"""Mixed read/write throughput and "database is locked" failures of the SQLite profiles:
+`default` (no pragmas, no retries) vs `production` (WAL and others, busy retries)
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+from benchmarks import setup_django, workload
+
+PROFILES = (
+    ("default", 0),
+    ("production", 3),
+)
+
+
+def main():
+    db_dir = tempfile.mkdtemp()
+    try:
+        workload.configure(os.path.join(db_dir, "unused.sqlite3"))
+        setup_django()
+        logging.disable(logging.CRITICAL)
+
+        from django.conf import settings
+        for profile, busy_retries in PROFILES:
+            # pragmas like journal mode persist in the file, so every profile gets its own one
+            settings.DATABASES["default"]["NAME"] = os.path.join(db_dir, f"{profile}.sqlite3")
+            settings.SQLITE_PROFILE = profile
+            settings.SQLITE_BUSY_RETRIES = busy_retries
+            users = workload.populate()
+            throughput, errors = workload.run(users)
+            print(f"profile={profile:<12} {throughput:8.1f} requests/s, {errors} errors")
+    finally:
+        shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Latency of the trending posts as the number of likes grows:
+materialized score (`core.trending`) vs `ORDER BY COUNT(likes)` aggregate
+"""
+import random
+
+from benchmarks import setup_django, test_database, timer
+
+NUM_USERS = 1000
+NUM_POSTS = 10000
+LIKE_VOLUMES = [10000, 50000, 200000]
+BATCH_SIZE = 5000
+NUM_REPEATS = 20
+TOP_SIZE = 20
+
+
+def main():
+    from django.db.models import Count
+
+    from trivio_backend.core import models
+    from trivio_backend.core.likes import apply_like_edges
+    from trivio_backend.core.trending import get_trending_posts
+
+    rnd = random.Random(42)
+    models.User.objects.bulk_create(
+        [models.User(username=f"user{i}", email=f"user{i}@example.com") for i in range(NUM_USERS)]
+    )
+    user_ids = list(models.User.objects.values_list("id", flat=True))
+    models.Post.objects.bulk_create(
+        [models.Post(user_id=rnd.choice(user_ids), title="title", content="content") for _ in range(NUM_POSTS)]
+    )
+    post_ids = list(models.Post.objects.values_list("id", flat=True))
+
+    edges = set()
+    timings = {}
+    for volume in LIKE_VOLUMES:
+        while len(edges) < volume:
+            batch = {}
+            while len(batch) < min(BATCH_SIZE, volume - len(edges)):
+                # a few posts get most of the likes
+                edge = (post_ids[int(rnd.paretovariate(0.8)) % NUM_POSTS], rnd.choice(user_ids))
+                if edge not in edges:
+                    batch[edge] = True
+            apply_like_edges(batch)
+            edges.update(batch)
+
+        with timer(timings, "score"):
+            for _ in range(NUM_REPEATS):
+                top = list(get_trending_posts(models.Post.objects, TOP_SIZE).values_list("id", flat=True))
+        with timer(timings, "aggregate"):
+            for _ in range(NUM_REPEATS):
+                list(
+                    models.Post.objects.annotate(total_likes=Count("likes"))
+                    .order_by("-total_likes", "-id")
+                    .values_list("id", flat=True)[:TOP_SIZE]
+                )
+        assert len(top) == TOP_SIZE
+        print(
+            f"{volume:>8} likes: score table {timings['score'] / NUM_REPEATS * 1e3:7.2f} ms/request, "
+            f"aggregate {timings['aggregate'] / NUM_REPEATS * 1e3:7.2f} ms/request"
+        )
+
+
+if __name__ == "__main__":
+    setup_django()
+    with test_database():
+        main()
@@ -0,0 +1,74 @@
+"""Mixed read/write API workload on SQLite files, shared by the database benchmarks
+"""
+import random
+import threading
+import time
+
+NUM_THREADS = 4
+REQUESTS_PER_THREAD = 300
+WRITE_RATIO = 0.2
+NUM_POSTS = 1000
+
+
+def configure(db_path):
+    """Must be called before `setup_django()`
+    """
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = db_path
+    # responses must come from the database, not from the response cache
+    settings.CACHES["default"] = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+    settings.ALLOWED_HOSTS.append("testserver")
+    settings.DEBUG = False
+
+
+def populate():
+    from django.core.management import call_command
+    from django.db import connections
+    from trivio_backend.core import models
+    call_command("migrate", verbosity=0)
+    users = [
+        models.User.objects.create(username=f"user{i}", email=f"user{i}@example.com")
+        for i in range(NUM_THREADS + 1)
+    ]
+    models.Post.objects.bulk_create([
+        models.Post(user=users[-1], title=f"title {i}", content="content " * 100)
+        for i in range(NUM_POSTS)
+    ])
+    connections.close_all()
+    return users[:NUM_THREADS]
+
+
+def worker(user, counters):
+    from django.db import connections, OperationalError
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+    for _ in range(REQUESTS_PER_THREAD):
+        post_id = random.randint(1, NUM_POSTS)
+        try:
+            if random.random() < WRITE_RATIO:
+                response = client.post(f"/api/v1/posts/{post_id}/{random.choice(['like', 'unlike'])}/")
+            elif random.random() < 0.5:
+                response = client.get("/api/v1/posts/", {"limit": 20})
+            else:
+                response = client.get(f"/api/v1/posts/{post_id}/")
+        except OperationalError:
+            # test client re-raises the errors, e.g. "database is locked"
+            counters["errors"] += 1
+            continue
+        counters["errors" if response.status_code >= 500 else "ok"] += 1
+    connections.close_all()
+
+
+def run(users):
+    """Returns (requests per second, number of failed requests)
+    """
+    counters = {"ok": 0, "errors": 0}
+    threads = [threading.Thread(target=worker, args=(user, counters)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counters["ok"] / (time.perf_counter() - started), counters["errors"]
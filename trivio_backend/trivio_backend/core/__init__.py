@@ -0,0 +1 @@
+default_app_config = 'trivio_backend.core.apps.CoreConfig'
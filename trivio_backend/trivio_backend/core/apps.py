@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class CoreConfig(AppConfig):
-    name = 'core'
+    name = 'trivio_backend.core'
+
+    def ready(self):
+        # connects `connection_created` receiver
+        from trivio_backend.core import sqlite  # noqa: F401
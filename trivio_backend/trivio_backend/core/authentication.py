@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from trivio_backend.core import models
+from trivio_backend.core.utils import TTLCache
+
+# the only user fields loaded on authentication, others are deferred and loaded on access.
+# Must follow the order of the model fields, see `Model.from_db`
+CACHED_USER_FIELDS = ("id", "is_superuser", "username", "is_staff", "is_active")
+
+# user id => values of `CACHED_USER_FIELDS`
+user_cache = TTLCache(settings.JWT_USER_CACHE_MAX_SIZE)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication that doesn't query the user on every request.
+
+    Authenticated user is a `User` instance with only `CACHED_USER_FIELDS` loaded from
+    in-process cache. Cache entry is dropped on every save of the user (e.g. password or
+    `is_active` change) in this process only: changes made by other processes or by
+    `QuerySet.update()` are seen after `JWT_USER_CACHE_TTL`, so a deactivated user can
+    still be authenticated for that time. The TTL is kept short for that reason
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        values = user_cache.get(user_id)
+        if values is None:
+            user = super().get_user(validated_token)
+            user_cache.set(
+                user_id, tuple(getattr(user, name) for name in CACHED_USER_FIELDS), settings.JWT_USER_CACHE_TTL
+            )
+            return user
+        return models.User.from_db(DEFAULT_DB_ALIAS, CACHED_USER_FIELDS, values)
+
+
+@receiver(post_save, sender=models.User)
+@receiver(post_delete, sender=models.User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_cache.delete(instance.pk)
@@ -0,0 +1,112 @@
+"""Bulk import of users, posts and likes, see `manage.py import_jsonl`.
+
+Every function imports one chunk of rows (dicts) in one transaction with batched INSERTs
+and returns number of the created rows. Rows that are already in the database are skipped,
+so an interrupted import can just be restarted:
+  * users are identified by `username` (or `email`, it's unique too):
+  `{"username", "email", ["id", "first_name", "last_name", "location", "password" (plain), "password_hash"]}`;
+  * posts by `id`: `{"id", "user_id" or "username", "title", "content", ["timestamp"]}`;
+  * likes by the pair of the post and the user: `{"post_id", "user_id" or "username"}`.
+Rows that refer unknown users (or posts, for likes) are skipped.
+
+Password hashing is slow by design, so every distinct plain password is hashed once per import,
+and users without any password get an unusable one.
+"""
+from django.contrib.auth.hashers import make_password
+from django.utils.dateparse import parse_datetime
+
+from trivio_backend.core import models
+from trivio_backend.core.likes import apply_like_edges
+from trivio_backend.core.response_cache import bump_posts_generation
+from trivio_backend.core.sqlite import immediate_atomic, in_chunks
+
+USER_FIELDS = ("first_name", "last_name", "location")
+
+
+class PasswordHasher:
+    """Memoized `make_password`: the same plain password gets the same hash (with the same salt)
+    """
+    def __init__(self):
+        self._hashes = {}
+
+    def __call__(self, password):
+        if password not in self._hashes:
+            self._hashes[password] = make_password(password)
+        return self._hashes[password]
+
+
+def _with_user_ids(rows):
+    """Rows with `user_id` of the user referred by `user_id` or `username`, without the rows of unknown users
+    """
+    known_ids = set()
+    for user_ids in in_chunks({row["user_id"] for row in rows if "user_id" in row}):
+        known_ids.update(models.User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+    known = {}
+    for usernames in in_chunks({row["username"] for row in rows if "user_id" not in row}):
+        known.update(models.User.objects.filter(username__in=usernames).values_list("username", "id"))
+    known_ids.update(known.values())
+    rows = [row if "user_id" in row else dict(row, user_id=known.get(row["username"])) for row in rows]
+    return [row for row in rows if row["user_id"] in known_ids]
+
+
+def import_users(rows, hash_password):
+    with immediate_atomic():
+        # both username and email are unique
+        existing = set()
+        for usernames in in_chunks({row["username"] for row in rows}):
+            existing.update(models.User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        for emails in in_chunks({row["email"] for row in rows}):
+            existing.update(models.User.objects.filter(email__in=emails).values_list("email", flat=True))
+        users = []
+        for row in rows:
+            if row["username"] in existing or row["email"] in existing:
+                continue
+            existing.update((row["username"], row["email"]))
+            user = models.User(
+                username=row["username"],
+                email=row["email"],
+                password=row.get("password_hash") or hash_password(row.get("password")),
+                **{field: row[field] for field in USER_FIELDS if field in row}
+            )
+            if "id" in row:
+                user.id = row["id"]
+            users.append(user)
+        models.User.objects.bulk_create(users)
+    return len(users)
+
+
+def import_posts(rows):
+    with immediate_atomic():
+        rows = _with_user_ids(rows)
+        existing = set()
+        for post_ids in in_chunks({row["id"] for row in rows}):
+            existing.update(models.Post.objects.filter(id__in=post_ids).values_list("id", flat=True))
+        posts = {}
+        for row in rows:
+            if row["id"] in existing or row["id"] in posts:
+                continue
+            posts[row["id"]] = models.Post(
+                id=row["id"], user_id=row["user_id"], title=row["title"], content=row["content"]
+            )
+        # `timestamp` is `auto_now`, so INSERT always sets the current time to it, but UPDATE doesn't
+        timestamps = {row["id"]: parse_datetime(row["timestamp"]) for row in rows if row.get("timestamp")}
+        models.Post.objects.bulk_create(posts.values())
+        with_timestamps = [post for post_id, post in posts.items() if timestamps.get(post_id)]
+        for post in with_timestamps:
+            post.timestamp = timestamps[post.id]
+        models.Post.objects.bulk_update(with_timestamps, ["timestamp"])
+        if posts:
+            bump_posts_generation()
+    return len(posts)
+
+
+def import_likes(rows):
+    """Likes are applied as usual, so `num_likes` counters and trending scores are kept in sync.
+    Likes of unknown posts are skipped
+    """
+    with immediate_atomic():
+        rows = _with_user_ids(rows)
+        post_ids = set()
+        for chunk in in_chunks({row["post_id"] for row in rows}):
+            post_ids.update(models.Post.objects.filter(id__in=chunk).values_list("id", flat=True))
+        return apply_like_edges({(row["post_id"], row["user_id"]): True for row in rows if row["post_id"] in post_ids})
@@ -0,0 +1,38 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# per-thread routing state of the current request, see `core.middleware.ReplicaRoutingMiddleware`
+_state = threading.local()
+
+
+def set_use_replica(use_replica):
+    _state.use_replica = use_replica
+
+
+def is_using_replica():
+    return bool(settings.DATABASE_REPLICAS) and getattr(_state, "use_replica", False)
+
+
+class ReadReplicaRouter:
+    """Sends reads to one of `DATABASE_REPLICAS` when the current request allows it,
+    everything else goes to the primary (`default`) database.
+
+    Users are always read from the primary: authentication must see the user who has just signed up
+    (the client is pinned to the primary by its new token only after that) and deactivated users at once
+    """
+    def db_for_read(self, model, **hints):
+        if is_using_replica() and model._meta.label != settings.AUTH_USER_MODEL:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,72 @@
+"""NDJSON export of posts and like edges, one JSON object per line.
+
+Rows are read with `QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE)` as plain values and
+written chunk by chunk, so memory use doesn't depend on the size of the tables.
+Exports are ordered by id: pass the last exported id as `since_id` to get only the new rows.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from trivio_backend.core import models
+from trivio_backend.core.likes import PostLikes
+
+POST_FIELDS = ("id", "user_id", "timestamp", "title", "content", "num_likes")
+LIKE_FIELDS = ("id", "post_id", "user_id")
+
+KINDS = ("posts", "likes")
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """Writes datetimes with microseconds (`DjangoJSONEncoder` cuts them to milliseconds),
+    so the exported timestamp can be passed back as `since` exactly
+    """
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def get_posts(since=None, since_id=None):
+    """Posts saved after `since` timestamp and/or with id greater than `since_id`.
+
+    `timestamp` is updated on every save of the post, but not by likes: posts whose `num_likes`
+    has changed since are not exported again
+    """
+    queryset = models.Post.objects.all()
+    if since is not None:
+        queryset = queryset.filter(timestamp__gt=since)
+    if since_id is not None:
+        queryset = queryset.filter(id__gt=since_id)
+    return queryset.order_by("id").values(*POST_FIELDS)
+
+
+def get_likes(since_id=None):
+    """Like edges with id greater than `since_id`. Likes have no timestamp, and unlikes are not exported
+    """
+    queryset = PostLikes.objects.all()
+    if since_id is not None:
+        queryset = queryset.filter(id__gt=since_id)
+    return queryset.order_by("id").values(*LIKE_FIELDS)
+
+
+def get_rows(kind, since=None, since_id=None):
+    if kind == "posts":
+        return get_posts(since=since, since_id=since_id)
+    return get_likes(since_id=since_id)
+
+
+def iter_ndjson(queryset):
+    """NDJSON text of the rows, one piece per chunk of `EXPORT_CHUNK_SIZE` rows
+    """
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    lines = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        lines.append(json.dumps(row, cls=ExportJSONEncoder, ensure_ascii=False))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
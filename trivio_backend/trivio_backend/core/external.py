@@ -4,7 +4,7 @@ import logging
 
 from django.conf import settings
 
-from trivio_backend.core.utils import call_external_api
+from trivio_backend.core.utils import call_external_api, TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -12,8 +12,41 @@ RE_EMAIL = re.compile(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)")
 HUNTER_VERIFIER_URL = "https://api.hunter.io/v2/email-verifier?email={email}&api_key={api_key}"
 CLEARBIT_ENRICHMENT_URL = "https://person.clearbit.com/v1/people/email/{email}"
 
+# email => verification result
+email_verification_cache = TTLCache(settings.EXTERNAL_CACHE_MAX_SIZE)
+# email domain => facts about the domain from the last hunter.io response
+email_domain_cache = TTLCache(settings.EXTERNAL_CACHE_MAX_SIZE)
+# email => clearbit data
+email_enrichment_cache = TTLCache(settings.EXTERNAL_CACHE_MAX_SIZE)
 
-def verify_email(email):
+_MISSING = object()
+
+
+def get_cache_stats():
+    return {
+        "email_verification": email_verification_cache.stats(),
+        "email_domain": email_domain_cache.stats(),
+        "email_enrichment": email_enrichment_cache.stats(),
+    }
+
+
+def _verify_by_domain(domain):
+    """Verification result known from the domain facts only, or None if hunter.io must be called
+    """
+    facts = email_domain_cache.get(domain)
+    if facts is None:
+        return None
+    if not facts["smtp_server"]:
+        # no mail server, so no address of the domain can pass
+        return False
+    if settings.EMAIL_HUNTER_TRUST_DOMAINS and (facts["webmail"] or facts["accept_all"]):
+        return True
+    return None
+
+
+def verify_email(email, deadline=None):
+    """True or False if the email is known to be valid or not, None if hunter.io can't tell it right now
+    """
     # hunter.io returns HTTP 400 for malformed emails, so let's filter them
     # regexp from https://emailregex.com
     if not RE_EMAIL.match(email):
@@ -22,31 +55,64 @@ def verify_email(email):
     if settings.EMAIL_HUNTER_API_KEY is None:
         logger.warning("hunter.io api key is not specified, working without it")
         return True
+    result = email_verification_cache.get(email, _MISSING)
+    if result is not _MISSING:
+        return result
+    domain = email.rsplit("@", 1)[1].lower()
+    result = _verify_by_domain(domain)
+    if result is not None:
+        return result
+
     # see https://hunter.io/api/v2/docs#email-verifier
     data = call_external_api(
         url=HUNTER_VERIFIER_URL.format(email=email, api_key=settings.EMAIL_HUNTER_API_KEY),
         timeout=20,
-        no_retry_status_codes=(400,)  # malformed url
+        no_retry_status_codes=(400,),  # malformed url
+        deadline=deadline,
     )
     if data is None:
         # it's better to send this case to sentry or something similar
         logger.info(f"problem of getting data from hunter.io")
-        return False
+        # unknown, not negative: the caller may retry later
+        return None
     if not data:
+        email_verification_cache.set(email, False, settings.EXTERNAL_CACHE_NEGATIVE_TTL)
         return False
     data = data["data"]
 
-    return data["regexp"] and data["smtp_server"] and data["smtp_check"]
+    facts = {
+        "smtp_server": bool(data.get("smtp_server")),
+        "webmail": bool(data.get("webmail")),
+        "accept_all": bool(data.get("accept_all")),
+    }
+    # a domain without mail server fails all its addresses, so it's kept as short as the other negative results
+    email_domain_cache.set(
+        domain, facts,
+        settings.EXTERNAL_CACHE_DOMAIN_TTL if facts["smtp_server"] else settings.EXTERNAL_CACHE_NEGATIVE_TTL,
+    )
+    result = data["regexp"] and data["smtp_server"] and data["smtp_check"]
+    email_verification_cache.set(
+        email, result, settings.EXTERNAL_CACHE_TTL if result else settings.EXTERNAL_CACHE_NEGATIVE_TTL
+    )
+    return result
 
 
-def enrich_email(email):
+def enrich_email(email, deadline=None):
     if settings.CLEARBIT_API_KEY is None:
         return {}
+    data = email_enrichment_cache.get(email)
+    if data is not None:
+        return data
     headers = {
         "Authorization": f"Bearer {settings.CLEARBIT_API_KEY}"
     }
     data = call_external_api(
         url=CLEARBIT_ENRICHMENT_URL.format(email=email),
         headers=headers,
+        deadline=deadline,
     )
+    if data is not None:
+        email_enrichment_cache.set(
+            email, data, settings.EXTERNAL_CACHE_TTL if data else settings.EXTERNAL_CACHE_NEGATIVE_TTL
+        )
     return data or {}
@@ -0,0 +1,112 @@
+"""Minimal DB-backed background jobs.
+
+`enqueue(func, **kwargs)` stores a call of module-level function `func` in `Job` table,
+`manage.py run_jobs` worker picks pending jobs up and executes them.
+Failed jobs are retried `JOBS_MAX_ATTEMPTS` times with growing delay, and so are the jobs
+lost by a crashed worker (running longer than `JOBS_LEASE_TIMEOUT`).
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from trivio_backend.core import models
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(func, **kwargs):
+    return enqueue_at(timezone.now(), func, **kwargs)
+
+
+def enqueue_at(run_at, func, **kwargs):
+    return models.Job.objects.create(
+        func=get_func_name(func),
+        kwargs=json.dumps(kwargs),
+        run_at=run_at,
+    )
+
+
+def get_func_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def requeue_lost_jobs():
+    """Jobs that are running longer than `JOBS_LEASE_TIMEOUT` were lost by a crashed worker:
+    retry them, or fail if they are out of attempts. Returns number of the found jobs
+    """
+    lost = models.Job.objects.filter(
+        # jobs claimed before `started_at` was added have no lease at all
+        Q(started_at__lt=timezone.now() - timedelta(seconds=settings.JOBS_LEASE_TIMEOUT)) | Q(started_at__isnull=True),
+        status=models.Job.STATUS_RUNNING,
+    )
+    num_failed = lost.filter(attempts__gte=settings.JOBS_MAX_ATTEMPTS).update(
+        status=models.Job.STATUS_FAILED, last_error="worker is lost",
+    )
+    num_requeued = lost.update(status=models.Job.STATUS_PENDING, last_error="worker is lost")
+    if num_failed or num_requeued:
+        logger.warning(f"{num_requeued} lost jobs requeued, {num_failed} failed")
+    return num_failed + num_requeued
+
+
+def claim_next_job():
+    """Mark the next due job as running and return it, or None if there are no due jobs
+    """
+    requeue_lost_jobs()
+    while True:
+        job = (
+            models.Job.objects
+            .filter(status=models.Job.STATUS_PENDING, run_at__lte=timezone.now())
+            .order_by("run_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        # several workers may race for the job, the conditional update lets only one of them win
+        started_at = timezone.now()
+        claimed = models.Job.objects.filter(pk=job.pk, status=models.Job.STATUS_PENDING).update(
+            status=models.Job.STATUS_RUNNING,
+            attempts=job.attempts + 1,
+            started_at=started_at,
+        )
+        if claimed:
+            job.status = models.Job.STATUS_RUNNING
+            job.attempts += 1
+            job.started_at = started_at
+            return job
+
+
+def run_job(job):
+    logger.info(f"running job {job.id} {job.func}, attempt {job.attempts}")
+    try:
+        import_string(job.func)(**json.loads(job.kwargs))
+    except Exception:
+        logger.exception(f"job {job.id} failed")
+        job.last_error = traceback.format_exc()
+        if job.attempts < settings.JOBS_MAX_ATTEMPTS:
+            job.status = models.Job.STATUS_PENDING
+            job.run_at = timezone.now() + timedelta(seconds=settings.JOBS_RETRY_DELAY * job.attempts)
+        else:
+            job.status = models.Job.STATUS_FAILED
+    else:
+        job.status = models.Job.STATUS_DONE
+    job.save(update_fields=["status", "run_at", "last_error"])
+    return job.status == models.Job.STATUS_DONE
+
+
+def run_pending_jobs(limit=None):
+    """Run due jobs until there are no more of them or `limit` is reached. Returns number of jobs run
+    """
+    num_jobs = 0
+    while limit is None or num_jobs < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        num_jobs += 1
+    return num_jobs
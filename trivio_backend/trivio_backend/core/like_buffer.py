@@ -0,0 +1,220 @@
+"""Write-behind buffer of likes, enabled by `LIKES_WRITE_BEHIND` setting.
+
+Like and unlike intents are kept in memory (the last intent of the user wins) and written
+to the database by batches, every `LIKES_FLUSH_INTERVAL` seconds or when `LIKES_FLUSH_SIZE`
+intents are pending. Readers add the pending intents to `Post.num_likes` of the response
+(see `get_deltas`), so users see their own likes at once, and the cached responses don't
+have to be invalidated until the batch is written.
+
+Readers do it in `reading()` section: the commit of a batch and dropping it from the pending state
+are one step for them, so they count it either in the database or in the buffer, never twice or none.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from trivio_backend.core.likes import apply_like_edges, get_liked_post_ids
+from trivio_backend.core.sqlite import immediate_atomic, in_chunks
+from trivio_backend.core.utils import ReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    def __init__(self):
+        # (post_id, user_id) => (like, whether the like is in the database)
+        self._edges = {}
+        # post_id => pending change of its `num_likes`
+        self._deltas = {}
+        # the same for the batch being written, readers still see it until the commit
+        self._in_flight_edges = {}
+        self._in_flight_deltas = {}
+        self._lock = threading.Lock()
+        # held while the batch is written, so the database state is not read in the middle of it
+        self._flush_lock = threading.Lock()
+        # readers against the commit of the batch
+        self._readers = ReadWriteLock()
+        self._flusher = None
+        self.num_flushes = 0
+        self.num_flushed = 0
+        self.last_flush_size = 0
+        self.last_flush_latency = 0.0
+
+    def reading(self):
+        """Section of a reader that reads `num_likes` or likes from the database and adds the pending ones
+        """
+        return self._readers.reading()
+
+    def add(self, post_id, user_id, like):
+        self.add_many(user_id, {post_id: like})
+
+    def add_many(self, user_id, actions):
+        """Buffer likes/unlikes of the user, `actions` maps post id to True (like) or False (unlike).
+
+        Likes unknown to the buffer are looked up in the database with one query
+        """
+        in_db = set()
+        queried = set()
+        while True:
+            with self._lock:
+                # a like known at first may be flushed by now, then it's looked up in the database too
+                unknown = [
+                    post_id for post_id in actions
+                    if post_id not in queried and self._get_known((post_id, user_id)) is None
+                ]
+                if not unknown:
+                    self._add_known(user_id, actions, in_db)
+                    depth = len(self._edges)
+                    break
+            with self._flush_lock:
+                for post_ids in in_chunks(unknown):
+                    in_db.update(get_liked_post_ids(user_id, post_ids))
+            queried.update(unknown)
+
+        if depth >= settings.LIKES_FLUSH_SIZE:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def _add_known(self, user_id, actions, in_db):
+        """Add the likes whose state in the database is known to the buffer or is in `in_db`, under `_lock`
+        """
+        for post_id, like in actions.items():
+            edge = (post_id, user_id)
+            previous = self._edges.get(edge)
+            if previous is not None:
+                edge_in_db = previous[1]
+                self._deltas[post_id] -= previous[0] - edge_in_db
+            elif edge in self._in_flight_edges:
+                # the batch being written will be in the database, see `_restore` otherwise
+                edge_in_db = self._in_flight_edges[edge][0]
+            else:
+                edge_in_db = post_id in in_db
+            self._edges[edge] = (like, edge_in_db)
+            self._deltas[post_id] = self._deltas.get(post_id, 0) + like - edge_in_db
+
+    def _get_known(self, edge):
+        """Whether the like is in the database, as the buffer knows it, or `None`
+        """
+        if edge in self._edges:
+            return self._edges[edge][1]
+        if edge in self._in_flight_edges:
+            return self._in_flight_edges[edge][0]
+        return None
+
+    def get_delta(self, post_id):
+        with self._lock:
+            return self._deltas.get(post_id, 0) + self._in_flight_deltas.get(post_id, 0)
+
+    def get_deltas(self, post_ids):
+        """`{post_id: pending change of num_likes}` of the posts that have pending likes
+        """
+        with self._lock:
+            if not self._deltas and not self._in_flight_deltas:
+                return {}
+            deltas = {
+                post_id: self._deltas.get(post_id, 0) + self._in_flight_deltas.get(post_id, 0)
+                for post_id in post_ids
+            }
+        return {post_id: delta for post_id, delta in deltas.items() if delta}
+
+    def merge_liked(self, user_id, liked_post_ids, post_ids):
+        """Apply pending likes of the user to the set of the posts liked by them
+        """
+        with self._lock:
+            if not self._edges and not self._in_flight_edges:
+                return
+            for post_id in post_ids:
+                edge = (post_id, user_id)
+                intent = self._edges.get(edge) or self._in_flight_edges.get(edge)
+                if intent is None:
+                    continue
+                if intent[0]:
+                    liked_post_ids.add(post_id)
+                else:
+                    liked_post_ids.discard(post_id)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                edges, self._edges = self._edges, {}
+                self._in_flight_edges = edges
+                self._in_flight_deltas, self._deltas = self._deltas, {}
+            if not edges:
+                return
+            started = time.perf_counter()
+            writing = False
+            try:
+                with immediate_atomic():
+                    # also bumps the generation of the cached responses
+                    apply_like_edges({edge: like for edge, (like, _) in edges.items()})
+                    # no reader is in the middle between the commit and dropping the in-flight state
+                    self._readers.acquire_write()
+                    writing = True
+            except Exception:
+                logger.exception(f"can't flush {len(edges)} likes")
+                self._restore(edges)
+                if writing:
+                    self._readers.release_write()
+                return
+            try:
+                latency = time.perf_counter() - started
+                with self._lock:
+                    self._in_flight_edges = {}
+                    self._in_flight_deltas = {}
+                    self.num_flushes += 1
+                    self.num_flushed += len(edges)
+                    self.last_flush_size = len(edges)
+                    self.last_flush_latency = latency
+            finally:
+                self._readers.release_write()
+
+    def _restore(self, edges):
+        """Put not written likes back unless there are newer intents for them.
+
+        The newer intents assumed the batch is in the database, so they get its actual state back
+        """
+        with self._lock:
+            self._in_flight_edges = {}
+            self._in_flight_deltas = {}
+            for edge, (like, in_db) in edges.items():
+                newer = self._edges.get(edge)
+                if newer is None:
+                    self._edges[edge] = (like, in_db)
+                    self._deltas[edge[0]] = self._deltas.get(edge[0], 0) + like - in_db
+                else:
+                    self._edges[edge] = (newer[0], in_db)
+                    self._deltas[edge[0]] += newer[1] - in_db
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_periodically, name="like-buffer", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.LIKES_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": len(self._edges),
+                "flushes": self.num_flushes,
+                "flushed": self.num_flushed,
+                "last_flush_size": self.last_flush_size,
+                "last_flush_latency": self.last_flush_latency,
+            }
+
+
+like_buffer = LikeBuffer()
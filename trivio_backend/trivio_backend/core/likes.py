@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from trivio_backend.core import models
+from trivio_backend.core.response_cache import bump_posts_generation
+from trivio_backend.core.sqlite import MAX_IN_PARAMS, in_chunks
+from trivio_backend.core.trending import add_scores
+
+PostLikes = models.Post.likes.through
+
+
+def _bump_num_likes(post, delta):
+    models.Post.objects.filter(pk=post.pk).update(num_likes=F("num_likes") + delta)
+    post.refresh_from_db(fields=["num_likes"])
+
+
+def add_like(post, user):
+    """Like the post, keeping `Post.num_likes` in sync. Returns True if the like is new
+    """
+    with transaction.atomic():
+        _, created = PostLikes.objects.get_or_create(post_id=post.pk, user_id=user.pk)
+        if created:
+            _bump_num_likes(post, 1)
+            add_scores({post.pk: 1})
+            bump_posts_generation()
+    return created
+
+
+def remove_like(post, user):
+    """Unlike the post, keeping `Post.num_likes` in sync. Returns True if the like existed
+    """
+    with transaction.atomic():
+        deleted, _ = PostLikes.objects.filter(post_id=post.pk, user_id=user.pk).delete()
+        if deleted:
+            _bump_num_likes(post, -1)
+            add_scores({post.pk: -1})
+            bump_posts_generation()
+    return bool(deleted)
+
+
+def get_liked_post_ids(user_id, post_ids):
+    """Which of the posts are liked by the user, it's one query for any number of posts
+    """
+    return set(
+        PostLikes.objects.filter(user_id=user_id, post_id__in=list(post_ids)).values_list("post_id", flat=True)
+    )
+
+
+def get_existing_edges(edges):
+    """Which of `(post_id, user_id)` edges are in the database.
+
+    Every chunk of the edges is one lookup of the unique index per edge, so the cost doesn't
+    depend on how many likes the posts and the users have (`post_id IN ... AND user_id IN ...`
+    would read all the likes of the posts by the users)
+    """
+    existing = set()
+    with connection.cursor() as cursor:
+        for chunk in in_chunks(edges, size=MAX_IN_PARAMS // 2):
+            cursor.execute(
+                f"SELECT likes.post_id, likes.user_id FROM (VALUES {', '.join(['(%s, %s)'] * len(chunk))}) AS edge "
+                f"JOIN {PostLikes._meta.db_table} AS likes "
+                f"ON likes.post_id = edge.column1 AND likes.user_id = edge.column2",
+                [value for edge in chunk for value in edge],
+            )
+            existing.update(cursor.fetchall())
+    return existing
+
+
+def apply_like_edges(edges):
+    """Apply many likes/unlikes in one transaction.
+
+    `edges` maps `(post_id, user_id)` to True (like) or False (unlike). Returns number of the changed edges
+    """
+    with transaction.atomic():
+        existing = get_existing_edges(edges)
+        added = [edge for edge, like in edges.items() if like and edge not in existing]
+        removed = [edge for edge, like in edges.items() if not like and edge in existing]
+        if added:
+            PostLikes.objects.bulk_create(
+                [PostLikes(post_id=post_id, user_id=user_id) for post_id, user_id in added],
+                ignore_conflicts=True,
+            )
+        removed_by_user = defaultdict(list)
+        for post_id, user_id in removed:
+            removed_by_user[user_id].append(post_id)
+        for user_id, removed_post_ids in removed_by_user.items():
+            for chunk in in_chunks(removed_post_ids):
+                PostLikes.objects.filter(user_id=user_id, post_id__in=chunk).delete()
+
+        deltas = Counter(post_id for post_id, _ in added)
+        deltas.subtract(post_id for post_id, _ in removed)
+        posts_by_delta = defaultdict(list)
+        for post_id, delta in deltas.items():
+            if delta:
+                posts_by_delta[delta].append(post_id)
+        for delta, delta_post_ids in posts_by_delta.items():
+            for chunk in in_chunks(delta_post_ids):
+                models.Post.objects.filter(pk__in=chunk).update(num_likes=F("num_likes") + delta)
+        add_scores(deltas)
+        if any(deltas.values()):
+            bump_posts_generation()
+    return len(added) + len(removed)
+
+
+def apply_likes(user, actions):
+    """Apply many likes/unlikes of the user in one transaction.
+
+    `actions` maps post id to True (like) or False (unlike). Returns `{post_id: num_likes}`
+    """
+    with transaction.atomic():
+        apply_like_edges({(post_id, user.pk): like for post_id, like in actions.items()})
+        return dict(models.Post.objects.filter(pk__in=list(actions)).values_list("id", "num_likes"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from trivio_backend.core import export
+
+
+class Command(BaseCommand):
+    help = "Export all the posts or like edges as NDJSON, see `core.export`"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=export.KINDS)
+        parser.add_argument("--since", help="export only posts saved after the ISO timestamp (likes don't count)")
+        parser.add_argument("--since-id", type=int, help="export only rows with greater id")
+        parser.add_argument("--output", help="file to write, stdout by default")
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        if since is not None:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                # well formatted, but not a valid date, e.g. the 13th month
+                since = None
+            if since is None or options["kind"] != "posts":
+                raise CommandError("--since must be ISO timestamp, and only posts can be exported by it")
+        rows = export.get_rows(options["kind"], since=since, since_id=options["since_id"])
+
+        if options["output"] is None:
+            for piece in export.iter_ndjson(rows):
+                self.stdout.write(piece, ending="")
+            return
+        with open(options["output"], "w", encoding="utf-8") as output:
+            for piece in export.iter_ndjson(rows):
+                output.write(piece)
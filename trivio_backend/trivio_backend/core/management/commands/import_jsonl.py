@@ -0,0 +1,57 @@
+import itertools
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trivio_backend.core import bulk_import
+
+
+class Command(BaseCommand):
+    help = "Import users, posts and likes from JSONL files by batches, see `core.bulk_import` for the formats"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", help="JSONL file of users")
+        parser.add_argument("--posts", help="JSONL file of posts")
+        parser.add_argument("--likes", help="JSONL file of likes")
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE,
+            help="rows per transaction",
+        )
+        parser.add_argument(
+            "--password",
+            help="plain password of the users without `password` and `password_hash`, unusable by default",
+        )
+
+    def handle(self, *args, **options):
+        hash_password = bulk_import.PasswordHasher()
+        importers = {
+            "users": lambda rows: bulk_import.import_users(
+                [dict(row, password=row.get("password", options["password"])) for row in rows], hash_password
+            ),
+            "posts": bulk_import.import_posts,
+            "likes": bulk_import.import_likes,
+        }
+        # users first, so posts and likes can refer them
+        for name, import_rows in importers.items():
+            if options[name]:
+                self.import_file(name, options[name], import_rows, options["batch_size"])
+
+    def import_file(self, name, path, import_rows, batch_size):
+        started = time.perf_counter()
+        num_rows = num_created = 0
+        with open(path, encoding="utf-8") as lines:
+            rows = (json.loads(line) for line in lines if line.strip())
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                num_created += import_rows(batch)
+                num_rows += len(batch)
+                self.stdout.write(f"{name}: {num_rows} rows, {num_rows / (time.perf_counter() - started):.0f} rows/s")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{name}: {num_created} of {num_rows} rows imported in {elapsed:.1f} s, "
+            f"{num_rows / max(elapsed, 1e-9):.0f} rows/s"
+        )
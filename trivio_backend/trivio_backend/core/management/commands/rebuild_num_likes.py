@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F
+
+from trivio_backend.core import models
+from trivio_backend.core.response_cache import bump_posts_generation
+
+
+class Command(BaseCommand):
+    help = "Check `Post.num_likes` counters against `Post.likes` and rebuild the wrong ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="only report mismatched counters, exit with error if there are any",
+        )
+
+    def handle(self, *args, **options):
+        mismatched = (
+            models.Post.objects
+            .annotate(actual_likes=Count("likes"))
+            .exclude(num_likes=F("actual_likes"))
+            .values_list("id", "num_likes", "actual_likes")
+        )
+        num_mismatched = 0
+        fixed_post_ids = []
+        for post_id, num_likes, actual_likes in list(mismatched):
+            num_mismatched += 1
+            self.stdout.write(f"post {post_id}: num_likes={num_likes}, actual={actual_likes}")
+            if not options["check"]:
+                models.Post.objects.filter(pk=post_id).update(num_likes=actual_likes)
+                fixed_post_ids.append(post_id)
+        # cached lists of the app still have the wrong counters, details are keyed by the counters
+        if fixed_post_ids:
+            bump_posts_generation()
+
+        if options["check"] and num_mismatched:
+            raise CommandError(f"{num_mismatched} posts have wrong num_likes")
+        self.stdout.write(f"{num_mismatched} mismatched counters {'found' if options['check'] else 'fixed'}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from trivio_backend.core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild full-text index of posts from scratch, see `core.search`"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="only check the index against the posts, exit with error if it's broken",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            try:
+                search.check_index()
+            except DatabaseError as e:
+                raise CommandError(f"search index is broken: {e}")
+            self.stdout.write("search index is ok")
+            return
+        search.rebuild_index()
+        self.stdout.write("search index rebuilt")
@@ -0,0 +1,29 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from trivio_backend.core.jobs import run_pending_jobs
+from trivio_backend.core.trending import schedule_decay
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Background jobs worker, see `core.jobs`"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="run due jobs and exit")
+        parser.add_argument("--sleep", type=float, default=1.0, help="polling interval in seconds")
+
+    def handle(self, *args, **options):
+        logger.info("jobs worker started")
+        if schedule_decay():
+            logger.info("trending scores decay is scheduled")
+        while True:
+            num_jobs = run_pending_jobs()
+            if options["once"]:
+                self.stdout.write(f"{num_jobs} jobs done")
+                return
+            if not num_jobs:
+                time.sleep(options["sleep"])
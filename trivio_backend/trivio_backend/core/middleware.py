@@ -0,0 +1,133 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+from rest_framework.permissions import SAFE_METHODS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from trivio_backend.core.db_routers import set_use_replica
+from trivio_backend.core.utils import TTLCache
+
+PINNED_COOKIE = "trivio_primary"
+
+# clients that have written recently, they read from the primary to see their own writes
+_pinned_clients = TTLCache(settings.DATABASE_STICKY_CACHE_MAX_SIZE)
+
+
+def _client_key(request):
+    auth = request.META.get("HTTP_AUTHORIZATION")
+    if auth:
+        return hashlib.md5(auth.encode()).hexdigest()
+    return request.META.get("REMOTE_ADDR")
+
+
+class ReplicaRoutingMiddleware:
+    """Lets safe requests to `DATABASE_REPLICA_PATHS` read from the replicas.
+
+    After a successful write the client is pinned to the primary for `DATABASE_STICKY_WINDOW`
+    seconds, both in-process and with a cookie for the other processes
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        client_key = _client_key(request)
+        is_read = request.method in SAFE_METHODS
+        set_use_replica(
+            is_read
+            and request.path.startswith(settings.DATABASE_REPLICA_PATHS)
+            and PINNED_COOKIE not in request.COOKIES
+            and _pinned_clients.get(client_key) is None
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            set_use_replica(False)
+
+        if not is_read and response.status_code < 400:
+            _pinned_clients.set(client_key, True, settings.DATABASE_STICKY_WINDOW)
+            response.set_cookie(PINNED_COOKIE, "1", max_age=settings.DATABASE_STICKY_WINDOW)
+        return response
+
+
+re_accepts_gzip = re.compile(r"\bgzip\b")
+re_accepts_brotli = re.compile(r"\bbr\b")
+
+
+def get_accepted_encoding(request):
+    """The best of the encodings accepted by the client: `br`, `gzip` or None
+    """
+    accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    if brotli is not None and re_accepts_brotli.search(accept_encoding):
+        return "br"
+    if re_accepts_gzip.search(accept_encoding):
+        return "gzip"
+    return None
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=settings.RESPONSE_COMPRESSION_BROTLI_QUALITY)
+    return compress_string(content)
+
+
+def _compress_brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.RESPONSE_COMPRESSION_BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_streaming(sequence, encoding):
+    if encoding == "br":
+        return _compress_brotli_sequence(sequence)
+    return compress_sequence(sequence)
+
+
+class CompressionMiddleware:
+    """`GZipMiddleware` with brotli (if `brotli` package is installed) and size threshold:
+    only responses of at least `RESPONSE_COMPRESSION_MIN_SIZE` bytes are worth the CPU time.
+    Streaming responses are always compressed
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = get_accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_streaming(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # the compressed body is not byte-equal to the original one, so the ETag is weak
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_auto_20190904_1117'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['timestamp', 'id'], name='core_post_timesta_97e067_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.5 on 2026-10-18 06:39
+
+from django.db import migrations, models
+
+
+def fill_num_likes(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    counts = Post.objects.annotate(actual_likes=models.Count('likes')).filter(actual_likes__gt=0)
+    for post_id, actual_likes in counts.values_list('id', 'actual_likes'):
+        Post.objects.filter(pk=post_id).update(num_likes=actual_likes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_auto_20261018_0638'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='num_likes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_num_likes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2026-10-18 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_auto_20261018_0641'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='core_post_user_id_942c8b_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# full-text index of posts, see `core.search`: external content FTS5 table kept in sync by triggers
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE core_post_search USING fts5(
+        title, content, content='core_post', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_post_search_insert AFTER INSERT ON core_post BEGIN
+        INSERT INTO core_post_search(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER core_post_search_delete AFTER DELETE ON core_post BEGIN
+        INSERT INTO core_post_search(core_post_search, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER core_post_search_update AFTER UPDATE OF title, content ON core_post BEGIN
+        INSERT INTO core_post_search(core_post_search, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO core_post_search(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    "INSERT INTO core_post_search(core_post_search) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    "DROP TRIGGER core_post_search_update",
+    "DROP TRIGGER core_post_search_delete",
+    "DROP TRIGGER core_post_search_insert",
+    "DROP TABLE core_post_search",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_auto_20261018_0651'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.5 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_auto_20261018_0657'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'verbose_name': 'user', 'verbose_name_plural': 'users'},
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='core_user_email_38052c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='core_user_usernam_e8adca_idx',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True, verbose_name='email address'),
+        ),
+    ]
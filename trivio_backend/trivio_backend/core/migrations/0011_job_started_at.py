@@ -0,0 +1,18 @@
+# Generated by Django 2.2.5 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_auto_20261018_0700'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='started_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
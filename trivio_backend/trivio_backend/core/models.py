@@ -1,15 +1,24 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.utils.translation import gettext_lazy as _
 
 
 class User(AbstractUser):
-    class Meta:
-        indexes = [
-            models.Index(fields=["email"]),
-            models.Index(fields=["username"]),
-        ]
+    # signup relies on the unique constraints instead of checking for existing users, see `auth_signup`
+    email = models.EmailField(_("email address"), unique=True)
     location = models.CharField(max_length=100, null=True)
 
+    VERIFICATION_PENDING = "pending"
+    VERIFICATION_VERIFIED = "verified"
+    VERIFICATION_FAILED = "failed"
+    # email verification runs in background after signup, see `core.tasks`
+    verification_state = models.CharField(max_length=16, default=VERIFICATION_VERIFIED, choices=[
+        (VERIFICATION_PENDING, "pending"),
+        (VERIFICATION_VERIFIED, "verified"),
+        (VERIFICATION_FAILED, "failed"),
+    ])
+
 
 class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -17,6 +26,60 @@ class Post(models.Model):
     title = models.CharField(max_length=256)
     content = models.TextField(max_length=32768)
     likes = models.ManyToManyField(User, related_name="likes")
+    # denormalized `likes.count()`, maintained by `core.likes`
+    num_likes = models.PositiveIntegerField(default=0)
 
     class Meta:
-        pass
+        indexes = [
+            models.Index(fields=["timestamp", "id"]),
+            models.Index(fields=["user", "timestamp", "id"]),
+        ]
+
+
+class PostScore(models.Model):
+    """Time-decayed like score of the post, see `core.trending`
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name="score")
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["score"]),
+        ]
+
+
+class CacheGeneration(models.Model):
+    """Counter shared by all the processes, the response cache keys include it. See `core.response_cache`
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+
+class Job(models.Model):
+    """Background job, executed by `manage.py run_jobs` worker. See `core.jobs`
+    """
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    func = models.CharField(max_length=256)
+    # json-encoded keyword arguments of `func`
+    kwargs = models.TextField(default="{}")
+    status = models.CharField(max_length=16, default=STATUS_PENDING, choices=[
+        (STATUS_PENDING, "pending"),
+        (STATUS_RUNNING, "running"),
+        (STATUS_DONE, "done"),
+        (STATUS_FAILED, "failed"),
+    ])
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # start of the current attempt: running jobs older than `JOBS_LEASE_TIMEOUT` are lost by a crashed worker
+    started_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"]),
+        ]
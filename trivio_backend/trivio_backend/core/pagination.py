@@ -0,0 +1,127 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import pagination, response
+from rest_framework.exceptions import NotFound, ParseError
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit("|", 1)
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise NotFound("invalid cursor")
+    if timestamp is None:
+        raise NotFound("invalid cursor")
+    return timestamp, pk
+
+
+def get_limit(request):
+    try:
+        limit = int(request.query_params.get("limit", settings.POSTS_PAGE_SIZE))
+    except ValueError:
+        limit = settings.POSTS_PAGE_SIZE
+    return max(1, min(limit, settings.POSTS_MAX_PAGE_SIZE))
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Cursor pagination over `(timestamp, id)`, newest posts first.
+
+    Query params: `limit`, `after` (next page), `before` (previous page).
+    Every page is a single index range scan, so its cost doesn't depend on depth.
+    """
+    timestamp_field = "timestamp"
+
+    def get_limit(self, request):
+        return get_limit(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ts = self.timestamp_field
+        limit = self.get_limit(request)
+        after = request.query_params.get("after")
+        before = request.query_params.get("before")
+
+        if before:
+            timestamp, pk = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(**{f"{ts}__gt": timestamp}) | Q(**{ts: timestamp, "id__gt": pk})
+            ).order_by(ts, "id")
+        else:
+            if after:
+                timestamp, pk = decode_cursor(after)
+                queryset = queryset.filter(
+                    Q(**{f"{ts}__lt": timestamp}) | Q(**{ts: timestamp, "id__lt": pk})
+                )
+            queryset = queryset.order_by(f"-{ts}", "-id")
+
+        rows = list(queryset[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(after)
+
+        self.next_cursor = self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = self.cursor_for(rows[-1])
+        if rows and has_previous:
+            self.previous_cursor = self.cursor_for(rows[0])
+        return rows
+
+    def cursor_for(self, row):
+        return encode_cursor(getattr(row, self.timestamp_field), row.id)
+
+    def get_links(self):
+        """`next` and `previous` of the page, they are a part of its ETag
+        """
+        return self.next_cursor, self.previous_cursor
+
+    def get_paginated_response(self, data):
+        return response.Response({
+            "next": self.next_cursor,
+            "previous": self.previous_cursor,
+            "results": data,
+        })
+
+
+class OffsetPagination(pagination.BasePagination):
+    """Pagination of ranked results (e.g. search), which have no stable key for cursors.
+
+    Query params: `limit` and `offset` (at most `POSTS_MAX_OFFSET`), the response has `next`/`previous` offsets.
+    Only `limit + 1` rows are fetched, there's no COUNT query.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = get_limit(request)
+        try:
+            offset = max(0, int(request.query_params.get("offset", 0)))
+        except ValueError:
+            offset = 0
+        if offset > settings.POSTS_MAX_OFFSET:
+            raise ParseError(f"offset must be at most {settings.POSTS_MAX_OFFSET}")
+        rows = list(queryset[offset:offset + limit + 1])
+        self.next_offset = offset + limit if len(rows) > limit else None
+        self.previous_offset = max(0, offset - limit) if offset else None
+        return rows[:limit]
+
+    def get_links(self):
+        return self.next_offset, self.previous_offset
+
+    def get_paginated_response(self, data):
+        return response.Response({
+            "next": self.next_offset,
+            "previous": self.previous_offset,
+            "results": data,
+        })
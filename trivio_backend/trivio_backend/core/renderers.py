@@ -0,0 +1,20 @@
+import msgpack
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+_json_encoder = JSONEncoder()
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Compact binary alternative to JSON, for `Accept: application/msgpack`
+    """
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # timestamps are serialized to strings already, the encoder is for the rest of types JSON supports
+        return msgpack.packb(data, use_bin_type=True, default=_json_encoder.default)
@@ -0,0 +1,93 @@
+"""Cache of serialized post responses, see `CACHES` setting.
+
+Stale entries are never read again (and are evicted eventually), as their keys change with the data:
+  * list pages (including posts of a user and trending posts) include `posts` generation,
+  which is bumped on every post creation, like and unlike (when they are written, see `like_buffer`);
+  * post details include the version of the post, see `get_post_key`.
+
+The generation is a row of `CacheGeneration` table, it's bumped in the transaction of the write,
+so all the processes (app workers, `run_jobs` worker, management commands) see it together with
+the data. Entries still expire after `RESPONSE_CACHE_TTL` in case some write missed the bump.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from trivio_backend.core import models
+from trivio_backend.core.db_routers import is_using_replica
+
+ENDPOINTS = ("post_detail", "posts_list", "user_posts", "posts_trending")
+
+POSTS_GENERATION = "posts"
+
+_stats = {endpoint: {"hits": 0, "misses": 0} for endpoint in ENDPOINTS}
+_stats_lock = threading.Lock()
+
+
+def get_generation(name):
+    # from the primary database: a replica may lag behind the writes that bumped it
+    try:
+        return models.CacheGeneration.objects.using(DEFAULT_DB_ALIAS).values_list("value", flat=True).get(name=name)
+    except models.CacheGeneration.DoesNotExist:
+        return 0
+
+
+def bump_generation(name):
+    """Invalidate all the entries of the generation, when the current transaction commits
+    """
+    generations = models.CacheGeneration.objects.filter(name=name)
+    if not generations.update(value=F("value") + 1):
+        _, created = models.CacheGeneration.objects.get_or_create(name=name, defaults={"value": 1})
+        if not created:
+            generations.update(value=F("value") + 1)
+
+
+def bump_posts_generation():
+    bump_generation(POSTS_GENERATION)
+
+
+def get_key(endpoint, params):
+    """Key of a list page, the generation must be read before the posts are
+    """
+    params_hash = hashlib.md5(params.encode()).hexdigest()
+    return f"response:{endpoint}:{get_generation(POSTS_GENERATION)}:{params_hash}"
+
+
+def get_post_key(post):
+    """Key of the post details: the post is changed only with its `timestamp` and `num_likes`
+    """
+    return f"response:post_detail:{post.id}:{post.timestamp.isoformat()}:{post.num_likes}"
+
+
+def get_cached(endpoint, key):
+    value = cache.get(key)
+    with _stats_lock:
+        _stats[endpoint]["hits" if value is not None else "misses"] += 1
+    return value
+
+
+def set_cached(key, value):
+    """Cache the response, unless it was read from a replica: the replica may lag behind
+    the primary, whose writes have already bumped the generation of the key
+    """
+    if is_using_replica():
+        return
+    cache.set(key, value, timeout=settings.RESPONSE_CACHE_TTL)
+
+
+def get_stats():
+    with _stats_lock:
+        return {
+            endpoint: dict(counters, hit_ratio=counters["hits"] / max(1, counters["hits"] + counters["misses"]))
+            for endpoint, counters in _stats.items()
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        for counters in _stats.values():
+            counters["hits"] = counters["misses"] = 0
@@ -0,0 +1,48 @@
+"""Full-text search of posts.
+
+The index is SQLite FTS5 table `core_post_search` over `title` and `content` of `core_post`
+(see migration `0008_post_search`). It stores no copy of the posts, and database triggers
+keep it in sync on every insert, update and delete, including bulk ones.
+"""
+from django.db import connection
+
+SEARCH_TABLE = "core_post_search"
+# BM25 weights of `title` and `content` columns: a word in the title is worth more
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+# control characters separate the words: FTS5 can't parse a query with NUL in it
+_CONTROL_CHARACTERS = {code: " " for code in [*range(0x20), *range(0x7f, 0xa0)]}
+
+
+def get_words(query):
+    return query.translate(_CONTROL_CHARACTERS).split()
+
+
+def get_match_query(query):
+    """FTS5 query of all the words of user input, so its syntax can't break the search
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in get_words(query))
+
+
+def search_posts(queryset, query):
+    """Posts of `queryset` that match all the words of `query`, the most relevant first
+    """
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f"{SEARCH_TABLE}.rowid = core_post.id", f"{SEARCH_TABLE} MATCH %s"],
+        params=[get_match_query(query)],
+        select={"rank": f"bm25({SEARCH_TABLE}, {TITLE_WEIGHT}, {CONTENT_WEIGHT})"},
+    ).order_by("rank", "-id")
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def check_index():
+    """Raises `DatabaseError` if the index doesn't match the posts
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('integrity-check', 1)")
@@ -0,0 +1,77 @@
+"""SQLite tuning: per-connection pragmas of `SQLITE_PROFILE` and write transactions that
+take the write lock at once and are retried when the database is busy
+"""
+import contextlib
+import functools
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections, transaction, DEFAULT_DB_ALIAS, OperationalError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# SQLite before 3.32 (ubuntu:18.04 has 3.22) allows at most 999 variables in a statement
+MAX_IN_PARAMS = 900
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PROFILES[settings.SQLITE_PROFILE].items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def in_chunks(values, size=MAX_IN_PARAMS):
+    """Split `values` of `__in` lookup into lists that fit into a single statement
+    """
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def is_busy_error(error):
+    return "database is locked" in str(error) or "database is busy" in str(error)
+
+
+@contextlib.contextmanager
+def immediate_atomic(using=DEFAULT_DB_ALIAS):
+    """`transaction.atomic` that takes SQLite write lock at the beginning of the transaction.
+
+    With the plain `BEGIN` two transactions that have both read something can't both upgrade
+    to write, and one of them fails with "database is locked" regardless of `busy_timeout`
+    """
+    connection = connections[using]
+    connection.begin_immediate = not connection.in_atomic_block
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
+
+
+def write_transaction(func):
+    """Run the view in immediate transaction, retrying it `SQLITE_BUSY_RETRIES` times if the database is busy
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        connection = connections[DEFAULT_DB_ALIAS]
+        retry_interval = settings.SQLITE_BUSY_RETRY_INTERVAL
+        for attempt in range(settings.SQLITE_BUSY_RETRIES + 1):
+            # retrying makes sense only if the whole transaction is ours
+            can_retry = attempt < settings.SQLITE_BUSY_RETRIES and not connection.in_atomic_block
+            try:
+                with immediate_atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if not (can_retry and is_busy_error(e)):
+                    raise
+                logger.info(f"database is busy, retrying {func.__name__}")
+                time.sleep(retry_interval)
+                retry_interval *= 2
+    return wrapper
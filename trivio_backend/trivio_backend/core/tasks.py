@@ -0,0 +1,67 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from trivio_backend.core import models
+from trivio_backend.core.external import verify_email, enrich_email
+from trivio_backend.core.jobs import enqueue_at
+from trivio_backend.core.utils import Deadline, get_external_executor
+
+logger = logging.getLogger(__name__)
+
+
+def update_field_if_empty(obj, field_name, new_value):
+    if new_value and not getattr(obj, field_name):
+        setattr(obj, field_name, new_value)
+
+
+def get_dict_value(root, path):
+    parts = path.split("/")
+    for part in parts:
+        root = root.get(part)
+        if root is None:
+            return None
+    return root
+
+
+def enrich_user(email, user, deadline=None):
+    update_user_from_enrichment(user, enrich_email(email, deadline=deadline))
+
+
+def update_user_from_enrichment(user, extra_data):
+    update_field_if_empty(user, "first_name", get_dict_value(extra_data, "name/givenName"))
+    update_field_if_empty(user, "last_name", get_dict_value(extra_data, "name/familyName"))
+    update_field_if_empty(user, "location", get_dict_value(extra_data, "location"))
+    user.save(update_fields=["first_name", "last_name", "location"])
+
+
+def verify_new_user(user_id, retry=0):
+    """Background part of the signup: email verification and profile enrichment.
+
+    While hunter.io is unavailable the verification is rescheduled with growing delay, without a limit
+    of retries, as the user would stay `pending` forever otherwise
+    """
+    user = models.User.objects.get(pk=user_id)
+    deadline = Deadline(settings.SIGNUP_EXTERNAL_DEADLINE)
+    # both lookups are made concurrently, so it takes as long as the slowest of them
+    executor = get_external_executor()
+    verification = executor.submit(verify_email, user.email, deadline=deadline)
+    enrichment = executor.submit(enrich_email, user.email, deadline=deadline)
+    verified = verification.result()
+    if verified is None:
+        enrichment.cancel()
+        delay = min(settings.SIGNUP_VERIFICATION_RETRY_DELAY * 2 ** retry, settings.SIGNUP_VERIFICATION_RETRY_MAX_DELAY)
+        logger.warning(f"can't verify email of user {user_id} now, retrying in {delay} seconds")
+        enqueue_at(timezone.now() + timedelta(seconds=delay), verify_new_user, user_id=user_id, retry=retry + 1)
+        return
+    if not verified:
+        enrichment.cancel()
+        logger.info(f"email of user {user_id} is not valid")
+        user.verification_state = models.User.VERIFICATION_FAILED
+        user.save(update_fields=["verification_state"])
+        return
+    update_user_from_enrichment(user, enrichment.result())
+    user.verification_state = models.User.VERIFICATION_VERIFIED
+    user.save(update_fields=["verification_state"])
@@ -1,14 +1,53 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+import brotli
+import msgpack
+import requests.adapters
+import requests.exceptions
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction, OperationalError
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import resolve
+from django.utils import timezone
 
 from unittest.mock import patch
 
 from rest_framework import status
-from rest_framework.test import force_authenticate, APIRequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import force_authenticate, APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from trivio_backend.core import models
-from trivio_backend.core.external import verify_email
-from trivio_backend.core.views.auth import enrich_user
+from trivio_backend.core import bulk_import, models, response_cache, trending
+from trivio_backend.core import external
+from trivio_backend.core.authentication import user_cache
+from trivio_backend.core.db_routers import ReadReplicaRouter, set_use_replica
+from trivio_backend.core.external import verify_email, enrich_email
+from trivio_backend.core.jobs import enqueue, requeue_lost_jobs, run_pending_jobs
+from trivio_backend.core.like_buffer import LikeBuffer, like_buffer
+from trivio_backend.core.likes import add_like
+from trivio_backend.core.middleware import PINNED_COOKIE, ReplicaRoutingMiddleware
+from trivio_backend.core.pagination import encode_cursor
+from trivio_backend.core.sqlite import immediate_atomic, write_transaction
+from trivio_backend.core.tasks import enrich_user
+from trivio_backend.core.utils import (
+    TTLCache, CircuitBreaker, Deadline, call_external_api, get_circuit_breakers_stats, set_transport_factory,
+)
+from trivio_backend.core.views.posts import PostSerializer, get_post_rows, serialize_post_rows
 
 
 class PostsApiTestCase(TestCase):
@@ -24,6 +63,8 @@ class PostsApiTestCase(TestCase):
             password="qwerty"
         )
         self.factory = APIRequestFactory()
+        cache.clear()
+        response_cache.reset_stats()
 
     def _post_api(self, url, data=None, user=None):
         if user is None:
@@ -49,6 +90,21 @@ class PostsApiTestCase(TestCase):
         self.assertEqual(post["title"], "title")
         self.assertEqual(models.Post.objects.count(), 1)
 
+    def test_userCreatesPostsInBulk(self):
+        response = self._post_api("/api/v1/posts/", [
+            {"content": f"post content {i}", "title": f"title {i}"}
+            for i in range(3)
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        posts = models.Post.objects.order_by("id")
+        self.assertEqual(response.data["ids"], [p.id for p in posts])
+        self.assertEqual([p.title for p in posts], ["title 0", "title 1", "title 2"])
+        self.assertTrue(all(p.user == self.user for p in posts))
+
+        response = self._post_api("/api/v1/posts/", [{"title": "title"}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(models.Post.objects.count(), 3)
+
     def test_userLikingActivity(self):
         post = models.Post.objects.create(
             user=self.user2,
@@ -56,20 +112,24 @@ class PostsApiTestCase(TestCase):
             title="title"
         )
         # first like
-        self._post_api(f"/api/v1/posts/{post.id}/like/")
+        response = self._post_api(f"/api/v1/posts/{post.id}/like/")
         self.assertEqual(post.likes.count(), 1)
+        self.assertEqual(response.data["num_likes"], 1)
 
         # second like
-        self._post_api(f"/api/v1/posts/{post.id}/like/")
+        response = self._post_api(f"/api/v1/posts/{post.id}/like/")
         self.assertEqual(post.likes.count(), 1)
+        self.assertEqual(response.data["num_likes"], 1)
 
         # unlike
-        self._post_api(f"/api/v1/posts/{post.id}/unlike/")
+        response = self._post_api(f"/api/v1/posts/{post.id}/unlike/")
         self.assertEqual(post.likes.count(), 0)
+        self.assertEqual(response.data["num_likes"], 0)
 
         # second unlike
-        self._post_api(f"/api/v1/posts/{post.id}/unlike/")
+        response = self._post_api(f"/api/v1/posts/{post.id}/unlike/")
         self.assertEqual(post.likes.count(), 0)
+        self.assertEqual(response.data["num_likes"], 0)
 
     def test_multiUserLike(self):
         post = models.Post.objects.create(
@@ -105,13 +165,756 @@ class PostsApiTestCase(TestCase):
             content="content",
             title="title"
         )
-        post.likes.add(self.user2)
+        add_like(post, self.user2)
 
         post_json = self._get_api(f"/api/v1/posts/{post.id}/").data
         self.assertEqual(post.id, post_json["id"])
         self.assertEqual(post_json["num_likes"], 1)
         self.assertEqual(post_json["title"], "title")
 
+    def _get_with_etag(self, url, etag, data=None):
+        request = self.factory.get(url, data, HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(request, user=self.user)
+        match = resolve(url)
+        return match.func(request, *match.args, **match.kwargs)
+
+    def test_getPostEtag(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        etag = self._get_api(f"/api/v1/posts/{post.id}/")["ETag"]
+
+        cache.clear()
+        # post version and `liked_by_me`
+        with self.assertNumQueries(2):
+            response = self._get_with_etag(f"/api/v1/posts/{post.id}/", etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        add_like(post, self.user2)
+        response = self._get_with_etag(f"/api/v1/posts/{post.id}/", etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["num_likes"], 1)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_listPostsEtag(self):
+        posts = [
+            models.Post.objects.create(user=self.user, content="content", title=f"title {i}")
+            for i in range(3)
+        ]
+        etag = self._get_api("/api/v1/posts/", {"limit": 2})["ETag"]
+        response = self._get_with_etag("/api/v1/posts/", etag, {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        add_like(posts[-1], self.user2)
+        response = self._get_with_etag("/api/v1/posts/", etag, {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the first post isn't at the page
+        etag = response["ETag"]
+        add_like(posts[0], self.user2)
+        response = self._get_with_etag("/api/v1/posts/", etag, {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_listPostsEtagCoversLinks(self):
+        for i in range(2):
+            models.Post.objects.create(user=self.user, content="content", title=f"title {i}")
+        response = self._get_api("/api/v1/posts/", {"limit": 2})
+        self.assertIsNone(response.data["next"])
+        # the same posts, but there is the next page now
+        older = models.Post.objects.create(user=self.user, content="content", title="older")
+        models.Post.objects.filter(pk=older.pk).update(timestamp=timezone.now() - timedelta(days=1))
+        response_cache.bump_posts_generation()
+        response = self._get_with_etag("/api/v1/posts/", response["ETag"], {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_responseCache(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        self._get_api(f"/api/v1/posts/{post.id}/")
+        self._get_api("/api/v1/posts/")
+        # only the version of the post (or the cache generation) and `liked_by_me` of the caller are queried
+        with self.assertNumQueries(4):
+            self.assertEqual(self._get_api(f"/api/v1/posts/{post.id}/").data["num_likes"], 0)
+            self.assertEqual(len(self._get_api("/api/v1/posts/").data["results"]), 1)
+
+        self._post_api(f"/api/v1/posts/{post.id}/like/", user=self.user2)
+        self.assertEqual(self._get_api(f"/api/v1/posts/{post.id}/").data["num_likes"], 1)
+        self.assertEqual(self._get_api("/api/v1/posts/").data["results"][0]["num_likes"], 1)
+
+        self._post_api("/api/v1/posts/", {"content": "content", "title": "title"})
+        self.assertEqual(len(self._get_api("/api/v1/posts/").data["results"]), 2)
+
+        stats = response_cache.get_stats()
+        self.assertEqual((stats["post_detail"]["hits"], stats["post_detail"]["misses"]), (1, 2))
+        self.assertEqual((stats["posts_list"]["hits"], stats["posts_list"]["misses"]), (1, 3))
+
+    def test_postsGenerationIsBumpedWithTheWrite(self):
+        generation = response_cache.get_generation("posts")
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                response_cache.bump_posts_generation()
+                self.assertEqual(response_cache.get_generation("posts"), generation + 1)
+                raise RuntimeError("rolled back")
+        self.assertEqual(response_cache.get_generation("posts"), generation)
+
+    def test_listPostsPagination(self):
+        posts = [
+            models.Post.objects.create(user=self.user, content="content", title=f"title {i}")
+            for i in range(5)
+        ]
+        expected_ids = [p.id for p in reversed(posts)]
+
+        page = self._get_api("/api/v1/posts/", {"limit": 2}).data
+        self.assertEqual([p["id"] for p in page["results"]], expected_ids[:2])
+        self.assertIsNone(page["previous"])
+
+        page = self._get_api("/api/v1/posts/", {"limit": 2, "after": page["next"]}).data
+        self.assertEqual([p["id"] for p in page["results"]], expected_ids[2:4])
+
+        last_page = self._get_api("/api/v1/posts/", {"limit": 2, "after": page["next"]}).data
+        self.assertEqual([p["id"] for p in last_page["results"]], expected_ids[4:])
+        self.assertIsNone(last_page["next"])
+
+        page = self._get_api("/api/v1/posts/", {"limit": 2, "before": page["previous"]}).data
+        self.assertEqual([p["id"] for p in page["results"]], expected_ids[:2])
+        self.assertIsNone(page["previous"])
+
+        response = self._get_api("/api/v1/posts/", {"after": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_listUserPosts(self):
+        posts = [
+            models.Post.objects.create(user=user, content="content", title="title")
+            for user in (self.user, self.user2, self.user, self.user2, self.user)
+        ]
+        page = self._get_api(f"/api/v1/users/{self.user.id}/posts/", {"limit": 2}).data
+        self.assertEqual([p["id"] for p in page["results"]], [posts[4].id, posts[2].id])
+        page = self._get_api(f"/api/v1/users/{self.user.id}/posts/", {"limit": 2, "after": page["next"]}).data
+        self.assertEqual([p["id"] for p in page["results"]], [posts[0].id])
+        self.assertIsNone(page["next"])
+
+        page = self._get_api(f"/api/v1/users/{self.user2.id}/posts/").data
+        self.assertEqual([p["id"] for p in page["results"]], [posts[3].id, posts[1].id])
+
+    def test_userPostsQueryPlan(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        cursor = encode_cursor(post.timestamp, post.id + 1)
+        with CaptureQueriesContext(connection) as queries:
+            self._get_api(f"/api/v1/users/{self.user.id}/posts/", {"after": cursor})
+        with connection.cursor() as cursor:
+            # after the query of the cache generation
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[1]['sql']}")
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("USING INDEX core_post_user_id_942c8b_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_listPostsQueryCount(self):
+        for i in range(10):
+            post = models.Post.objects.create(user=self.user, content="content", title="title")
+            add_like(post, self.user2)
+        # cache generation, page and `liked_by_me` marks of the page
+        with self.assertNumQueries(3):
+            posts = self._get_api("/api/v1/posts/", user=self.user2).data["results"]
+        self.assertEqual([p["num_likes"] for p in posts], [1] * 10)
+        self.assertEqual([p["liked_by_me"] for p in posts], [True] * 10)
+
+    def test_likedByMe(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        post2 = models.Post.objects.create(user=self.user, content="content", title="title")
+        add_like(post, self.user2)
+
+        anonymous = self._get_api("/api/v1/posts/", user=AnonymousUser())
+        self.assertNotIn("liked_by_me", anonymous.data["results"][0])
+        response = self._get_api("/api/v1/posts/", user=self.user2)
+        self.assertEqual([p["liked_by_me"] for p in response.data["results"]], [False, True])
+        own = self._get_api("/api/v1/posts/")
+        self.assertEqual([p["liked_by_me"] for p in own.data["results"]], [False, False])
+        # the cached page is shared, but ETags are not
+        self.assertNotEqual(response["ETag"], own["ETag"])
+        self.assertTrue(self._get_api(f"/api/v1/posts/{post.id}/", user=self.user2).data["liked_by_me"])
+
+        with self.settings(LIKES_WRITE_BEHIND=True):
+            self._post_api(f"/api/v1/posts/{post2.id}/like/", user=self.user2)
+            response = self._get_api(f"/api/v1/posts/{post2.id}/", user=self.user2)
+            self.assertTrue(response.data["liked_by_me"])
+            like_buffer.flush()
+
+    def test_postRowsSerialization(self):
+        models.Post.objects.create(user=self.user, content="Привет, \"мир\"\n", title="title")
+        models.Post.objects.create(user=self.user2, content="", title="")
+        queryset = models.Post.objects.order_by("id")
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(serialize_post_rows(get_post_rows(queryset))),
+            renderer.render(PostSerializer(queryset, many=True).data),
+        )
+
+    def test_sparseFieldsets(self):
+        post = models.Post.objects.create(user=self.user, content="x" * 10000, title="title")
+        full = self._get_api("/api/v1/posts/", user=AnonymousUser())
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get_api("/api/v1/posts/", {"fields": "title,num_likes"}, user=AnonymousUser())
+        self.assertEqual(response.data["results"], [{"id": post.id, "num_likes": 0, "title": "title"}])
+        self.assertNotIn('"content"', queries[1]["sql"])
+        self.assertNotEqual(response["ETag"], full["ETag"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get_api("/api/v1/posts/", {"fields": "content", "excerpt": 100})
+        self.assertEqual(response.data["results"][0]["content"], "x" * 100)
+        self.assertIn("SUBSTR", queries[1]["sql"].upper())
+        self.assertIn("liked_by_me", response.data["results"][0])
+        response = self._get_api("/api/v1/posts/trending/", {"fields": "title", "excerpt": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self._get_api("/api/v1/posts/", {"fields": "title,password"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for excerpt in ("-1", "0", "²", "1.5"):
+            response = self._get_api("/api/v1/posts/", {"excerpt": excerpt})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # longer than any content
+        response = self._get_api("/api/v1/posts/", {"fields": "content", "excerpt": "9" * 25})
+        self.assertEqual(response.data["results"][0]["content"], post.content)
+        response = self._get_api(f"/api/v1/posts/{post.id}/", {"excerpt": "9" * 25})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_messagePackResponses(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        client = APIClient()
+        json_response = client.get(f"/api/v1/posts/{post.id}/")
+        response = client.get(f"/api/v1/posts/{post.id}/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(json_response.content))
+        self.assertIn("Accept", response["Vary"])
+        # the same version of the post, but another representation
+        self.assertNotEqual(response["ETag"], json_response["ETag"])
+        response = client.get(
+            "/api/v1/posts/", HTTP_ACCEPT="application/msgpack", HTTP_IF_NONE_MATCH=json_response["ETag"]
+        )
+        self.assertEqual(msgpack.unpackb(response.content)["results"][0]["id"], post.id)
+
+    def test_responseCompression(self):
+        post = models.Post.objects.create(user=self.user, content="content " * 1000, title="title")
+        client = APIClient()
+        response = client.get(f"/api/v1/posts/{post.id}/", HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(response.content))["id"], post.id)
+        self.assertTrue(response["ETag"].startswith("W/"))
+        response = client.get(f"/api/v1/posts/{post.id}/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["id"], post.id)
+        response = client.get(f"/api/v1/posts/{post.id}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        small = models.Post.objects.create(user=self.user, content="content", title="title")
+        response = client.get(f"/api/v1/posts/{small.id}/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_batchLikes(self):
+        post = models.Post.objects.create(user=self.user2, content="content", title="title")
+        post2 = models.Post.objects.create(user=self.user2, content="content", title="title")
+        add_like(post2, self.user)
+
+        response = self._post_api("/api/v1/posts/likes/", [
+            {"post_id": post.id, "action": "like"},
+            {"post_id": post2.id, "action": "unlike"},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {"post_id": post.id, "num_likes": 1},
+            {"post_id": post2.id, "num_likes": 0},
+        ])
+        self.assertEqual(list(post.likes.all()), [self.user])
+        self.assertEqual(post2.likes.count(), 0)
+
+        # repeated actions change nothing
+        response = self._post_api("/api/v1/posts/likes/", [
+            {"post_id": post.id, "action": "like"},
+            {"post_id": post2.id, "action": "unlike"},
+        ])
+        self.assertEqual([item["num_likes"] for item in response.data], [1, 0])
+
+        response = self._post_api("/api/v1/posts/likes/", [{"post_id": True, "action": "like"}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batchLikesIsAtomic(self):
+        own_post = models.Post.objects.create(user=self.user, content="content", title="title")
+        post = models.Post.objects.create(user=self.user2, content="content", title="title")
+        response = self._post_api("/api/v1/posts/likes/", [
+            {"post_id": post.id, "action": "like"},
+            {"post_id": own_post.id, "action": "like"},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._post_api("/api/v1/posts/likes/", [
+            {"post_id": post.id, "action": "like"},
+            {"post_id": post.id + 100, "action": "like"},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(post.likes.count(), 0)
+
+    @override_settings(LIKES_WRITE_BEHIND=True)
+    @patch("trivio_backend.core.like_buffer.LikeBuffer._ensure_flusher", lambda self: None)
+    def test_writeBehindLikes(self):
+        post = models.Post.objects.create(user=self.user2, content="content", title="title")
+        user3 = models.User.objects.create(email="me3@example.com", username="me3")
+
+        self.assertEqual(self._post_api(f"/api/v1/posts/{post.id}/like/").data["num_likes"], 1)
+        self.assertEqual(self._post_api(f"/api/v1/posts/{post.id}/unlike/").data["num_likes"], 0)
+        self.assertEqual(self._post_api(f"/api/v1/posts/{post.id}/like/").data["num_likes"], 1)
+        response = self._post_api("/api/v1/posts/likes/", [{"post_id": post.id, "action": "like"}], user=user3)
+        self.assertEqual(response.data, [{"post_id": post.id, "num_likes": 2}])
+        self.assertEqual(post.likes.count(), 0)
+        self.assertEqual(self._get_api(f"/api/v1/posts/{post.id}/").data["num_likes"], 2)
+        self.assertEqual(self._get_api("/api/v1/posts/").data["results"][0]["num_likes"], 2)
+        self.assertEqual(like_buffer.stats()["depth"], 2)
+
+        like_buffer.flush()
+        self.assertEqual(set(post.likes.all()), {self.user, user3})
+        post.refresh_from_db()
+        self.assertEqual(post.num_likes, 2)
+        self.assertEqual(self._get_api(f"/api/v1/posts/{post.id}/").data["num_likes"], 2)
+        stats = like_buffer.stats()
+        self.assertEqual((stats["depth"], stats["last_flush_size"]), (0, 2))
+
+        # unlike of the flushed like
+        self.assertEqual(self._post_api(f"/api/v1/posts/{post.id}/unlike/").data["num_likes"], 1)
+        like_buffer.flush()
+        self.assertEqual(list(post.likes.all()), [user3])
+
+    @patch("trivio_backend.core.like_buffer.LikeBuffer._ensure_flusher", lambda self: None)
+    def test_writeBehindLikesDuringFlush(self):
+        post = models.Post.objects.create(user=self.user2, content="content", title="title")
+        buffer = LikeBuffer()
+        buffer.add(post.id, self.user.id, True)
+        seen = []
+
+        def failing_apply(edges):
+            # the batch being written is still visible to the readers
+            liked = set()
+            buffer.merge_liked(self.user.id, liked, [post.id])
+            seen.append((buffer.get_delta(post.id), liked))
+            buffer.add(post.id, self.user.id, False)
+            seen.append(buffer.get_delta(post.id))
+            raise OperationalError("database is locked")
+
+        with patch("trivio_backend.core.like_buffer.apply_like_edges", failing_apply):
+            buffer.flush()
+        self.assertEqual(seen, [(1, {post.id}), 0])
+        # the newer unlike is kept against the actual database state
+        self.assertEqual(buffer.get_delta(post.id), 0)
+        buffer.add(post.id, self.user.id, True)
+        self.assertEqual(buffer.get_delta(post.id), 1)
+        buffer.flush()
+        self.assertEqual(buffer.get_delta(post.id), 0)
+        self.assertEqual(list(post.likes.all()), [self.user])
+
+    @patch("trivio_backend.core.like_buffer.LikeBuffer._ensure_flusher", lambda self: None)
+    def test_writeBehindBatchLikes(self):
+        posts = [models.Post.objects.create(user=self.user2, content="content", title="title") for _ in range(3)]
+        posts[0].likes.add(self.user)
+        buffer = LikeBuffer()
+        generation = response_cache.get_generation(response_cache.POSTS_GENERATION)
+        # one query for all the likes, no generation bumps
+        with self.assertNumQueries(1):
+            buffer.add_many(self.user.id, {post.id: True for post in posts})
+        with self.assertNumQueries(0):
+            buffer.add_many(self.user.id, {post.id: False for post in posts[1:]})
+        self.assertEqual(buffer.get_deltas([post.id for post in posts]), {})
+        buffer.add(posts[1].id, self.user.id, True)
+        self.assertEqual(buffer.get_deltas([post.id for post in posts]), {posts[1].id: 1})
+        self.assertEqual(response_cache.get_generation(response_cache.POSTS_GENERATION), generation)
+
+        buffer.flush()
+        self.assertEqual(response_cache.get_generation(response_cache.POSTS_GENERATION), generation + 1)
+        self.assertEqual(set(self.user.likes.all()), {posts[0], posts[1]})
+
+    @patch("trivio_backend.core.like_buffer.LikeBuffer._ensure_flusher", lambda self: None)
+    def test_writeBehindReadersDuringCommit(self):
+        post = models.Post.objects.create(user=self.user2, content="content", title="title")
+        buffer = LikeBuffer()
+        buffer.add(post.id, self.user.id, True)
+        acquire_write = buffer._readers.acquire_write
+        seen = []
+
+        def read():
+            with buffer.reading():
+                seen.append(buffer.get_delta(post.id))
+
+        def acquire_write_with_reader():
+            acquire_write()
+            # the batch is about to be committed: a reader waits until it's dropped from the buffer
+            reader = threading.Thread(target=read)
+            reader.start()
+            reader.join(0.1)
+            seen.append(reader.is_alive())
+            readers.append(reader)
+
+        readers = []
+        with patch.object(buffer._readers, "acquire_write", acquire_write_with_reader):
+            buffer.flush()
+        readers[0].join()
+        self.assertEqual(seen, [True, 0])
+        post.refresh_from_db()
+        self.assertEqual(post.num_likes, 1)
+
+    def test_rebuildNumLikes(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        post.likes.add(self.user2)
+        self.assertEqual(self._get_api(f"/api/v1/posts/{post.id}/").data["num_likes"], 0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_num_likes", "--check", stdout=StringIO())
+
+        call_command("rebuild_num_likes", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.num_likes, 1)
+        # the cached response is invalidated
+        self.assertEqual(self._get_api(f"/api/v1/posts/{post.id}/").data["num_likes"], 1)
+        call_command("rebuild_num_likes", "--check", stdout=StringIO())
+
+    def test_searchPosts(self):
+        in_content = models.Post.objects.create(user=self.user, content="walking my dogs", title="sunday")
+        in_title = models.Post.objects.create(user=self.user, content="long walk", title="dog")
+        models.Post.objects.create(user=self.user, content="cats", title="cats")
+
+        response = self._get_api("/api/v1/posts/search/", {"q": "dog"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [in_title.id, in_content.id])
+        page = self._get_api("/api/v1/posts/search/", {"q": "dog", "limit": 1}).data
+        self.assertEqual(page["next"], 1)
+        page = self._get_api("/api/v1/posts/search/", {"q": "dog", "limit": 1, "offset": page["next"]}).data
+        self.assertEqual([p["id"] for p in page["results"]], [in_content.id])
+        self.assertEqual((page["next"], page["previous"]), (None, 0))
+        # all the words must match, query syntax is not interpreted
+        self.assertEqual(len(self._get_api("/api/v1/posts/search/", {"q": "dog cats"}).data["results"]), 0)
+        self.assertEqual(len(self._get_api("/api/v1/posts/search/", {"q": 'dog" OR "cats'}).data["results"]), 0)
+        response = self._get_api("/api/v1/posts/search/", {"q": " "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_searchBadParams(self):
+        post = models.Post.objects.create(user=self.user, content="walking my dogs", title="sunday")
+        response = self._get_api("/api/v1/posts/search/", {"q": "\x00"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._get_api("/api/v1/posts/search/", {"q": "walking\x00dogs\x1f"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [post.id])
+
+        response = self._get_api("/api/v1/posts/search/", {"q": "dogs", "offset": settings.POSTS_MAX_OFFSET})
+        self.assertEqual(response.data["results"], [])
+        for offset in (settings.POSTS_MAX_OFFSET + 1, 10 ** 25):
+            response = self._get_api("/api/v1/posts/search/", {"q": "dogs", "offset": offset})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_searchIndexIsIncremental(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="apple")
+        self._post_api("/api/v1/posts/", [{"content": "apple pie", "title": "title"}])
+        self.assertEqual(len(self._get_api("/api/v1/posts/search/", {"q": "apple"}).data["results"]), 2)
+
+        post.title = "orange"
+        post.save()
+        self.assertEqual(len(self._get_api("/api/v1/posts/search/", {"q": "apple"}).data["results"]), 1)
+        self.assertEqual(self._get_api("/api/v1/posts/search/", {"q": "orange"}).data["results"][0]["id"], post.id)
+        post.delete()
+        self.assertEqual(len(self._get_api("/api/v1/posts/search/", {"q": "orange"}).data["results"]), 0)
+
+        call_command("rebuild_search_index", "--check", stdout=StringIO())
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self._get_api("/api/v1/posts/search/", {"q": "apple"}).data["results"]), 1)
+
+    def test_trendingPosts(self):
+        posts = [models.Post.objects.create(user=self.user, content="content", title="title") for _ in range(3)]
+        user3 = models.User.objects.create(email="me3@example.com", username="me3")
+        add_like(posts[0], self.user2)
+        self._post_api("/api/v1/posts/likes/", [
+            {"post_id": posts[1].id, "action": "like"},
+            {"post_id": posts[0].id, "action": "like"},
+        ], user=user3)
+        self._post_api(f"/api/v1/posts/{posts[1].id}/like/", user=self.user2)
+        self._post_api(f"/api/v1/posts/{posts[0].id}/unlike/", user=self.user2)
+        # liked and unliked post isn't trending
+        self._post_api(f"/api/v1/posts/{posts[2].id}/like/", user=self.user2)
+        self._post_api(f"/api/v1/posts/{posts[2].id}/unlike/", user=self.user2)
+        self.assertFalse(models.PostScore.objects.filter(post=posts[2]).exists())
+
+        response = self._get_api("/api/v1/posts/trending/")
+        self.assertEqual([p["id"] for p in response.data["results"]], [posts[1].id, posts[0].id])
+        self.assertEqual(response.data["results"][0]["num_likes"], 2)
+        self.assertEqual(len(self._get_api("/api/v1/posts/trending/", {"limit": 1}).data["results"]), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            list(trending.get_trending_posts(models.Post.objects, 10))
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("core_postsc_score_015078_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_trendingScoresDecay(self):
+        post = models.Post.objects.create(user=self.user, content="content", title="title")
+        post2 = models.Post.objects.create(user=self.user, content="content", title="title")
+        trending.add_scores({post.id: 2, post2.id: 1})
+        self.assertTrue(trending.schedule_decay())
+        self.assertFalse(trending.schedule_decay())
+        # decay job of a crashed worker is retried, and once it's out of attempts the chain starts again
+        lost_at = timezone.now() - timedelta(seconds=settings.JOBS_LEASE_TIMEOUT + 1)
+        models.Job.objects.update(status=models.Job.STATUS_RUNNING, attempts=1, started_at=lost_at)
+        self.assertFalse(trending.schedule_decay())
+        self.assertEqual(models.Job.objects.get().status, models.Job.STATUS_PENDING)
+        models.Job.objects.update(
+            status=models.Job.STATUS_RUNNING, attempts=settings.JOBS_MAX_ATTEMPTS, started_at=lost_at,
+        )
+        self.assertTrue(trending.schedule_decay())
+        self.assertEqual(models.Job.objects.filter(status=models.Job.STATUS_PENDING).count(), 1)
+        models.Job.objects.all().delete()
+
+        decayed_at = timezone.now() - timedelta(seconds=settings.TRENDING_HALF_LIFE)
+        trending.decay_scores(decayed_at.isoformat())
+        self.assertAlmostEqual(models.PostScore.objects.get(post=post).score, 1.0, places=3)
+        next_decay = models.Job.objects.get()
+        self.assertGreater(next_decay.run_at, timezone.now())
+
+        decayed_at = timezone.now() - timedelta(seconds=settings.TRENDING_HALF_LIFE * 6)
+        trending.decay_scores(decayed_at.isoformat())
+        self.assertEqual([p["id"] for p in self._get_api("/api/v1/posts/trending/").data["results"]], [post.id])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_exportNdjson(self):
+        posts = [models.Post.objects.create(user=self.user, content="content", title=f"title {i}") for i in range(3)]
+        add_like(posts[0], self.user2)
+        add_like(posts[2], self.user2)
+        self.assertEqual(self._get_api("/api/v1/export/posts/").status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+
+        response = self._get_api("/api/v1/export/posts/")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [post.id for post in posts])
+        self.assertEqual((rows[0]["title"], rows[0]["num_likes"], rows[0]["user_id"]), ("title 0", 1, self.user.id))
+        # microseconds are kept
+        self.assertEqual(rows[0]["timestamp"], models.Post.objects.get(pk=posts[0].id).timestamp.isoformat())
+
+        response = self._get_api("/api/v1/export/likes/", {"since_id": 1})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row["post_id"], row["user_id"]) for row in rows], [(posts[2].id, self.user2.id)])
+        since = models.Post.objects.get(pk=posts[1].id).timestamp.isoformat()
+        self.assertEqual(self._get_api("/api/v1/export/likes/", {"since": since}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        output = StringIO()
+        call_command("export_ndjson", "posts", "--since", since, stdout=output)
+        self.assertEqual([json.loads(line)["id"] for line in output.getvalue().splitlines()], [posts[2].id])
+
+        # well formatted, but not valid dates
+        for since in ("2020-13-01T00:00:00", "2020-02-30T00:00:00", "2020-01-01T25:00:00"):
+            response = self._get_api("/api/v1/export/posts/", {"since": since})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            with self.assertRaises(CommandError):
+                call_command("export_ndjson", "posts", "--since", since, stdout=StringIO())
+
+    def test_importJsonl(self):
+        files = {
+            "users": [
+                {"username": "bulk1", "email": "bulk1@example.com", "password": "secret"},
+                {"username": "bulk2", "email": "bulk2@example.com", "location": "Moscow"},
+            ],
+            "posts": [
+                {"id": 100, "username": "bulk1", "title": "title", "content": "content",
+                 "timestamp": "2019-09-01T10:00:00+00:00"},
+                {"id": 101, "user_id": self.user.id, "title": "title", "content": "content"},
+                {"id": 102, "username": "unknown", "title": "title", "content": "content"},
+            ],
+            "likes": [
+                {"post_id": 100, "username": "bulk2"},
+                {"post_id": 100, "user_id": self.user.id},
+                {"post_id": 101, "username": "bulk1"},
+                {"post_id": 102, "username": "bulk1"},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            args = []
+            for name, rows in files.items():
+                path = os.path.join(directory, f"{name}.jsonl")
+                with open(path, "w") as f:
+                    f.writelines(json.dumps(row) + "\n" for row in rows)
+                args += [f"--{name}", path]
+            output = StringIO()
+            call_command("import_jsonl", *args, "--batch-size", "2", "--password", "default", stdout=output)
+            self.assertIn("likes: 3 of 4 rows imported", output.getvalue())
+            # everything is skipped the second time
+            output = StringIO()
+            call_command("import_jsonl", *args, stdout=output)
+            self.assertIn("users: 0 of 2 rows imported", output.getvalue())
+            self.assertIn("posts: 0 of 3 rows imported", output.getvalue())
+
+        bulk1, bulk2 = models.User.objects.get(username="bulk1"), models.User.objects.get(username="bulk2")
+        self.assertTrue(bulk1.check_password("secret"))
+        self.assertTrue(bulk2.check_password("default"))
+        self.assertEqual(bulk2.location, "Moscow")
+        post = models.Post.objects.get(pk=100)
+        self.assertEqual((post.user, post.num_likes), (bulk1, 2))
+        self.assertEqual(post.timestamp.isoformat(), "2019-09-01T10:00:00+00:00")
+        self.assertEqual(list(models.Post.objects.get(pk=101).likes.all()), [bulk1])
+        self.assertFalse(models.Post.objects.filter(pk=102).exists())
+
+    def test_importLargeBatch(self):
+        size = 1000
+        users = [{"username": f"bulk{i}", "email": f"bulk{i}@example.com"} for i in range(size)]
+        posts = [{"id": 1000 + i, "username": f"bulk{i}", "title": "title", "content": ""} for i in range(size)]
+        likes = [{"post_id": 1000 + i, "username": f"bulk{(i + 1) % size}"} for i in range(size)]
+        # the limit of SQLite before 3.32
+        connection.ensure_connection()
+        previous_limit = connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        try:
+            self.assertEqual(bulk_import.import_users(users, bulk_import.PasswordHasher()), size)
+            self.assertEqual(bulk_import.import_posts(posts), size)
+            generation = response_cache.get_generation(response_cache.POSTS_GENERATION)
+            self.assertEqual(bulk_import.import_likes(likes), size)
+            self.assertEqual(bulk_import.import_likes(likes), 0)
+        finally:
+            connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, previous_limit)
+        self.assertEqual(models.Post.objects.filter(num_likes=1).count(), size)
+        # one bump of the cached responses per batch that changed anything
+        self.assertEqual(response_cache.get_generation(response_cache.POSTS_GENERATION), generation + 1)
+
+    def test_importDenseLikes(self):
+        size = 40
+        users = [{"username": f"bulk{i}", "email": f"bulk{i}@example.com"} for i in range(size)]
+        bulk_import.import_users(users, bulk_import.PasswordHasher())
+        bulk_import.import_posts([{"id": 1000 + i, "username": "bulk0", "title": "", "content": ""} for i in range(size)])
+        grid = [{"post_id": 1000 + i, "username": f"bulk{j}"} for i in range(size) for j in range(1, size)]
+        self.assertEqual(bulk_import.import_likes(grid[::2]), len(grid[::2]))
+        # the existing likes are looked up by their pairs, not by all the likes of the posts and the users
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk_import.import_likes(grid), len(grid) - len(grid[::2]))
+        lookup = next(query["sql"] for query in queries if "JOIN core_post_likes" in query["sql"])
+        self.assertIn("VALUES", lookup)
+        self.assertEqual(set(models.Post.objects.values_list("num_likes", flat=True)), {size - 1})
+
+
+class AuthenticationTestCase(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = models.User.objects.create(email="me@example.com", username="me")
+        self.user2 = models.User.objects.create(email="me2@example.com", username="me2")
+        self.post = models.Post.objects.create(user=self.user2, content="content", title="title")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def _like(self):
+        return self.client.post(f"/api/v1/posts/{self.post.id}/like/")
+
+    def test_cachedUser(self):
+        self._like()
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as not_cached:
+            self.assertEqual(self._like().status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as cached:
+            self.assertEqual(self._like().status_code, status.HTTP_200_OK)
+        self.assertEqual(len(cached), len(not_cached) - 1)
+        self.assertFalse(any("core_user" in query["sql"] for query in cached))
+        self.assertEqual(list(self.post.likes.all()), [self.user])
+
+    def test_inactiveUser(self):
+        self._like()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._like().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @patch("django.conf.settings.JWT_USER_CACHE_TTL", 0.5)
+    def test_inactiveUserInAnotherProcess(self):
+        self._like()
+        # no signal, as if it was done by another process
+        models.User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self._like().status_code, status.HTTP_200_OK)
+        time.sleep(0.5)
+        self.assertEqual(self._like().status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReadReplicaRouter()
+        self.used_databases = []
+
+    def _handle(self, response_status):
+        def get_response(request):
+            self.used_databases.append(self.router.db_for_read(models.Post))
+            return HttpResponse(status=response_status)
+        return ReplicaRoutingMiddleware(get_response)
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_routing(self):
+        auth = {"HTTP_AUTHORIZATION": "Bearer 1"}
+        self._handle(200)(self.factory.get("/api/v1/posts/", **auth))
+        self._handle(200)(self.factory.get("/api/v1/auth/refresh/", **auth))
+        self._handle(400)(self.factory.post("/api/v1/posts/", **auth))
+        self._handle(200)(self.factory.get("/api/v1/posts/1/", **auth))
+        self.assertEqual(self.used_databases, ["replica", "default", "default", "replica"])
+        self.assertEqual(self.router.db_for_read(models.Post), "default")
+        self.assertEqual(self.router.db_for_write(models.Post), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_usersAreReadFromPrimary(self):
+        # the token of the user who has just signed up isn't pinned to the primary yet
+        used_databases = []
+
+        def get_response(request):
+            used_databases.append((self.router.db_for_read(models.User), self.router.db_for_read(models.Post)))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(get_response)(self.factory.get("/api/v1/posts/", HTTP_AUTHORIZATION="Bearer 5"))
+        self.assertEqual(used_databases, [("default", "replica")])
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_readOwnWrites(self):
+        auth = {"HTTP_AUTHORIZATION": "Bearer 2"}
+        response = self._handle(201)(self.factory.post("/api/v1/posts/", **auth))
+        self._handle(200)(self.factory.get("/api/v1/posts/", **auth))
+        self._handle(200)(self.factory.get("/api/v1/posts/", HTTP_AUTHORIZATION="Bearer 3"))
+        # another process knows about the write by the cookie only
+        self.factory.cookies[PINNED_COOKIE] = response.cookies[PINNED_COOKIE].value
+        self._handle(200)(self.factory.get("/api/v1/posts/", HTTP_AUTHORIZATION="Bearer 4"))
+        self.assertEqual(self.used_databases, ["default", "default", "replica", "default"])
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_replicaReadsAreNotCached(self):
+        cache.clear()
+        set_use_replica(True)
+        try:
+            response_cache.set_cached("response:test", "lagging")
+        finally:
+            set_use_replica(False)
+        self.assertIsNone(cache.get("response:test"))
+        response_cache.set_cached("response:test", "fresh")
+        self.assertEqual(cache.get("response:test"), "fresh")
+
+
+class SqliteTestCase(TransactionTestCase):
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PROFILES["production"]["busy_timeout"])
+
+    def test_immediateAtomic(self):
+        with CaptureQueriesContext(connection) as queries:
+            with immediate_atomic():
+                models.User.objects.count()
+            with transaction.atomic():
+                models.User.objects.count()
+        self.assertEqual([q["sql"] for q in queries if q["sql"].startswith("BEGIN")], ["BEGIN IMMEDIATE", "BEGIN"])
+
+    @override_settings(SQLITE_BUSY_RETRY_INTERVAL=0)
+    def test_writeTransactionRetries(self):
+        calls = []
+
+        @write_transaction
+        def busy_view():
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError("database is locked")
+            return "done"
+
+        self.assertEqual(busy_view(), "done")
+        self.assertEqual(calls, [True, True, True])
+
+        calls.clear()
+        with override_settings(SQLITE_BUSY_RETRIES=1):
+            with self.assertRaises(OperationalError):
+                busy_view()
+        self.assertEqual(len(calls), 2)
+
 
 class Patches:
     @staticmethod
@@ -140,6 +943,18 @@ class Patches:
 
 
 class ExternalTestCase(TestCase):
+    def setUp(self):
+        external.email_verification_cache.clear()
+        external.email_domain_cache.clear()
+        external.email_enrichment_cache.clear()
+        self.num_calls = 0
+
+    def _counting(self, patch_func):
+        def call_external_api(*args, **kwargs):
+            self.num_calls += 1
+            return patch_func(*args, **kwargs)
+        return call_external_api
+
     @patch("trivio_backend.core.external.call_external_api", Patches.call_external_api_hunter)
     @patch("django.conf.settings.EMAIL_HUNTER_API_KEY", "123")
     def test_verifyEmail(self):
@@ -152,6 +967,62 @@ class ExternalTestCase(TestCase):
     def test_notVerifyEmail(self):
         self.assertFalse(verify_email("diver@gmail.com"))
 
+    @patch("django.conf.settings.EMAIL_HUNTER_API_KEY", "123")
+    def test_verifyEmailCache(self):
+        with patch("trivio_backend.core.external.call_external_api", self._counting(Patches.call_external_api_hunter)):
+            self.assertTrue(verify_email("diver@gmail.com"))
+            self.assertTrue(verify_email("diver@gmail.com"))
+            self.assertEqual(self.num_calls, 1)
+        with patch("trivio_backend.core.external.call_external_api", self._counting(Patches.call_external_api_none)):
+            # failures of the API are not cached
+            self.assertFalse(verify_email("other@gmail.com"))
+            self.assertFalse(verify_email("other@gmail.com"))
+            self.assertEqual(self.num_calls, 3)
+        with patch("trivio_backend.core.external.call_external_api", self._counting(lambda *a, **kw: {})):
+            # HTTP 400 is cached
+            self.assertFalse(verify_email("other@gmail.com"))
+            self.assertFalse(verify_email("other@gmail.com"))
+            self.assertEqual(self.num_calls, 4)
+        self.assertEqual(external.get_cache_stats()["email_verification"]["hits"], 2)
+
+    @patch("django.conf.settings.EMAIL_HUNTER_API_KEY", "123")
+    @patch("django.conf.settings.EMAIL_HUNTER_TRUST_DOMAINS", True)
+    def test_verifyEmailDomainCache(self):
+        def hunter_webmail(*args, **kwargs):
+            data = Patches.call_external_api_hunter()
+            data["data"]["webmail"] = True
+            return data
+
+        with patch("trivio_backend.core.external.call_external_api", self._counting(hunter_webmail)):
+            self.assertTrue(verify_email("diver@gmail.com"))
+            self.assertTrue(verify_email("diver2@gmail.com"))
+            self.assertTrue(verify_email("diver2@example.com"))
+            self.assertEqual(self.num_calls, 2)
+
+    @patch("django.conf.settings.EMAIL_HUNTER_API_KEY", "123")
+    def test_verifyEmailNegativeDomainCache(self):
+        def hunter_no_smtp(*args, **kwargs):
+            data = Patches.call_external_api_hunter()
+            data["data"]["smtp_server"] = False
+            return data
+
+        with patch("trivio_backend.core.external.call_external_api", self._counting(hunter_no_smtp)):
+            self.assertFalse(verify_email("diver@example.com"))
+            self.assertFalse(verify_email("diver2@example.com"))
+            self.assertEqual(self.num_calls, 1)
+            # negative domain facts expire with the negative TTL, not the domain one
+            with patch("django.conf.settings.EXTERNAL_CACHE_NEGATIVE_TTL", -1):
+                self.assertFalse(verify_email("diver@example.org"))
+                self.assertFalse(verify_email("diver2@example.org"))
+            self.assertEqual(self.num_calls, 3)
+
+    @patch("django.conf.settings.CLEARBIT_API_KEY", "123")
+    def test_enrichEmailCache(self):
+        with patch("trivio_backend.core.external.call_external_api", self._counting(Patches.call_external_api_clearbit)):
+            self.assertEqual(enrich_email("diver@gmail.com")["location"], "Moscow")
+            self.assertEqual(enrich_email("diver@gmail.com")["location"], "Moscow")
+            self.assertEqual(self.num_calls, 1)
+
     @patch("trivio_backend.core.external.call_external_api", Patches.call_external_api_clearbit)
     @patch("django.conf.settings.CLEARBIT_API_KEY", "123")
     def test_enrich_user(self):
@@ -184,20 +1055,314 @@ class ExternalTestCase(TestCase):
         self.assertEqual(user.location, None)
 
 
-class AuthTestCase(TestCase):
-    @patch("trivio_backend.core.views.auth.verify_email", lambda email: True)
-    @patch("trivio_backend.core.views.auth.enrich_email", lambda email: {})
-    def test_signup(self):
-        self.assertEqual(models.User.objects.count(), 0)
+class StubTransport(requests.adapters.BaseAdapter):
+    instances = []
+
+    def __init__(self):
+        super().__init__()
+        self.num_requests = 0
+        StubTransport.instances.append(self)
+
+    def send(self, request, **kwargs):
+        self.num_requests += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"ok": true}'
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+class UtilsTestCase(TestCase):
+    def setUp(self):
+        StubTransport.instances = []
+        set_transport_factory(StubTransport)
 
+    def tearDown(self):
+        set_transport_factory(None)
+
+    def test_callExternalApiReusesSessions(self):
+        for i in range(5):
+            self.assertEqual(call_external_api(f"https://api.hunter.io/v2/email-verifier?n={i}"), {"ok": True})
+        call_external_api("https://person.clearbit.com/v1/people/email/a@b.c")
+        self.assertEqual([t.num_requests for t in StubTransport.instances], [5, 1])
+
+    def _count_connections(self, num_calls):
+        """Number of the TCP connections made by the real transport for `num_calls` calls
+        """
+        client_ports = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                client_ports.append(self.client_address[1])
+                body = b'{"ok": true}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        set_transport_factory(None)
+        try:
+            for i in range(num_calls):
+                self.assertEqual(call_external_api(f"http://127.0.0.1:{server.server_port}/?n={i}"), {"ok": True})
+        finally:
+            set_transport_factory(None)
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(len(client_ports), num_calls)
+        return len(set(client_ports))
+
+    def test_callExternalApiReusesConnections(self):
+        self.assertEqual(self._count_connections(5), 1)
+        with override_settings(EXTERNAL_HTTP_KEEP_ALIVE=False):
+            self.assertEqual(self._count_connections(5), 5)
+
+    def test_circuitBreaker(self):
+        class FlakyTransport(StubTransport):
+            failing = True
+
+            def send(self, request, **kwargs):
+                if self.failing:
+                    self.num_requests += 1
+                    raise requests.exceptions.ConnectionError()
+                return super().send(request, **kwargs)
+
+        set_transport_factory(FlakyTransport)
+        url = "https://api.hunter.io/v2/email-verifier"
+        with patch("django.conf.settings.EXTERNAL_BREAKER_FAILURE_THRESHOLD", 2), \
+                patch("django.conf.settings.EXTERNAL_BREAKER_RESET_TIMEOUT", 0.05):
+            # failed call is counted once, not per attempt
+            self.assertIsNone(call_external_api(url, retry_interval=0))
+            self.assertEqual(StubTransport.instances[0].num_requests, 3)
+            self.assertEqual(get_circuit_breakers_stats()["https://api.hunter.io"]["state"], "closed")
+            self.assertIsNone(call_external_api(url, retry_interval=0))
+            # opened after the second failed call, so the third one wasn't made
+            self.assertIsNone(call_external_api(url, retry_interval=0))
+            self.assertEqual(StubTransport.instances[0].num_requests, 6)
+            self.assertEqual(get_circuit_breakers_stats()["https://api.hunter.io"], {
+                "state": "open", "failures": 2, "trips": 1,
+            })
+
+            # half-open probe succeeds
+            time.sleep(0.05)
+            FlakyTransport.failing = False
+            self.assertEqual(call_external_api(url), {"ok": True})
+            self.assertEqual(get_circuit_breakers_stats()["https://api.hunter.io"]["state"], "closed")
+
+    def test_circuitBreakerIgnoresClientErrors(self):
+        class NotFoundTransport(StubTransport):
+            def send(self, request, **kwargs):
+                response = super().send(request, **kwargs)
+                response.status_code = 404
+                return response
+
+        set_transport_factory(NotFoundTransport)
+        url = "https://person.clearbit.com/v1/people/email/a@b.c"
+        with patch("django.conf.settings.EXTERNAL_BREAKER_FAILURE_THRESHOLD", 1):
+            for i in range(3):
+                self.assertEqual(call_external_api(url, no_retry_status_codes=(404,)), {})
+        self.assertEqual(get_circuit_breakers_stats()["https://person.clearbit.com"], {
+            "state": "closed", "failures": 0, "trips": 0,
+        })
+
+    def test_circuitBreakerProbeFailsUnexpectedly(self):
+        class BrokenTransport(StubTransport):
+            broken = True
+
+            def send(self, request, **kwargs):
+                if self.broken:
+                    self.num_requests += 1
+                    raise ValueError("broken")
+                return super().send(request, **kwargs)
+
+        set_transport_factory(BrokenTransport)
+        url = "https://api.hunter.io/v2/email-verifier"
+        with patch("django.conf.settings.EXTERNAL_BREAKER_FAILURE_THRESHOLD", 1), \
+                patch("django.conf.settings.EXTERNAL_BREAKER_RESET_TIMEOUT", 0.05):
+            with self.assertRaises(ValueError):
+                call_external_api(url)
+            self.assertEqual(get_circuit_breakers_stats()["https://api.hunter.io"]["state"], "open")
+            # the failed probe opens the breaker again instead of leaving it half-open forever
+            time.sleep(0.05)
+            with self.assertRaises(ValueError):
+                call_external_api(url)
+            self.assertEqual(get_circuit_breakers_stats()["https://api.hunter.io"]["state"], "open")
+            time.sleep(0.05)
+            BrokenTransport.broken = False
+            self.assertEqual(call_external_api(url), {"ok": True})
+
+    def test_circuitBreakerLostProbe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.05)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        # the probe never reported back
+        time.sleep(0.05)
+        self.assertTrue(breaker.allow())
+
+    def test_deadline(self):
+        class SlowTransport(StubTransport):
+            def send(self, request, timeout=None, **kwargs):
+                self.num_requests += 1
+                time.sleep(timeout)
+                raise requests.exceptions.Timeout()
+
+        set_transport_factory(SlowTransport)
+        deadline = Deadline(0.1)
+        started = time.monotonic()
+        self.assertIsNone(call_external_api("https://api.hunter.io/", timeout=5, deadline=deadline))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(deadline.expired)
+
+    def test_externalStats(self):
+        admin = models.User.objects.create(username="admin", email="admin@example.com", is_staff=True)
+        call_external_api("https://api.hunter.io/")
+        request = APIRequestFactory().get("/api/v1/monitoring/external/")
+        force_authenticate(request, user=admin)
+        data = resolve("/api/v1/monitoring/external/").func(request).data
+        self.assertEqual(data["circuit_breakers"]["https://api.hunter.io"]["state"], "closed")
+        self.assertIn("email_verification", data["caches"])
+
+    def test_ttlCache(self):
+        cache = TTLCache(max_size=2)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        self.assertEqual(cache.get("a"), 1)
+        # "b" is the least recently used now
+        cache.set("c", 3, ttl=60)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        cache.set("a", 1, ttl=-1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"size": 1, "hits": 2, "misses": 2})
+
+
+class AuthTestCase(TestCase):
+    def _signup(self, email, username="me"):
         factory = APIRequestFactory()
         url = "/api/v1/auth/signup/"
         request = factory.post(url, {
-            "email": "me@example.com",
-            "username": "me",
+            "email": email,
+            "username": username,
             "password": "qwerty"
         }, format="json")
         match = resolve(url)
-        match.func(request, *match.args, **match.kwargs)
+        return match.func(request, *match.args, **match.kwargs)
+
+    @patch("trivio_backend.core.tasks.verify_email", lambda email, **kwargs: True)
+    @patch("trivio_backend.core.tasks.enrich_email", lambda email, **kwargs: {"location": "Moscow"})
+    def test_signup(self):
+        self.assertEqual(models.User.objects.count(), 0)
+
+        response = self._signup("me@example.com")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["verification"], models.User.VERIFICATION_PENDING)
+        self.assertEqual(models.User.objects.count(), 1)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        user = models.User.objects.get()
+        self.assertEqual(user.verification_state, models.User.VERIFICATION_VERIFIED)
+        self.assertEqual(user.location, "Moscow")
+        self.assertEqual(models.Job.objects.get().status, models.Job.STATUS_DONE)
+
+    @patch("trivio_backend.core.tasks.verify_email", lambda email, **kwargs: False)
+    def test_signupNotVerified(self):
+        self._signup("me@example.com")
+        run_pending_jobs()
+        user = models.User.objects.get()
+        self.assertEqual(user.verification_state, models.User.VERIFICATION_FAILED)
+
+    @patch("trivio_backend.core.tasks.verify_email", lambda email, **kwargs: time.sleep(0.2) or True)
+    @patch("trivio_backend.core.tasks.enrich_email", lambda email, **kwargs: time.sleep(0.2) or {"location": "Moscow"})
+    def test_signupLookupsAreConcurrent(self):
+        self._signup("me@example.com")
+        started = time.monotonic()
+        run_pending_jobs()
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(models.User.objects.get().location, "Moscow")
+
+    @patch("trivio_backend.core.tasks.verify_email", lambda email, **kwargs: False)
+    @patch("trivio_backend.core.tasks.enrich_email", lambda email, **kwargs: {"location": "Moscow"})
+    def test_signupNotVerifiedIsNotEnriched(self):
+        self._signup("me@example.com")
+        run_pending_jobs()
+        self.assertIsNone(models.User.objects.get().location)
+
+    def test_signupConflict(self):
+        # the user and its verification job, in a savepoint as the test is in a transaction already
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._signup("me@example.com").status_code, status.HTTP_201_CREATED)
+        self.assertEqual([q["sql"].split()[0] for q in queries], ["SAVEPOINT", "INSERT", "INSERT", "RELEASE"])
+        self.assertTrue(models.User.objects.get().check_password("qwerty"))
 
+        self.assertEqual(self._signup("me@example.com", username="other").status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self._signup("other@example.com").status_code, status.HTTP_409_CONFLICT)
         self.assertEqual(models.User.objects.count(), 1)
+        self.assertEqual(models.Job.objects.count(), 1)
+
+    @patch("trivio_backend.core.tasks.verify_email", lambda email, **kwargs: None)
+    @patch("django.conf.settings.JOBS_MAX_ATTEMPTS", 1)
+    def test_signupVerificationIsRetried(self):
+        self._signup("me@example.com")
+        # rescheduled with growing delay, beyond the attempts of a job
+        for retry in range(1, 10):
+            models.Job.objects.update(run_at=timezone.now())
+            self.assertEqual(run_pending_jobs(), 1)
+            job = models.Job.objects.get(status=models.Job.STATUS_PENDING)
+            self.assertEqual(json.loads(job.kwargs)["retry"], retry)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertAlmostEqual(delay, settings.SIGNUP_VERIFICATION_RETRY_MAX_DELAY, delta=5)
+        self.assertEqual(models.User.objects.get().verification_state, models.User.VERIFICATION_PENDING)
+        self.assertFalse(models.Job.objects.filter(status=models.Job.STATUS_FAILED).exists())
+
+    def test_signupMalformedEmail(self):
+        response = self._signup("me@example_")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(models.User.objects.count(), 0)
+
+
+def failing_task():
+    raise RuntimeError("failure")
+
+
+class JobsTestCase(TestCase):
+    @patch("django.conf.settings.JOBS_MAX_ATTEMPTS", 2)
+    def test_lostJobsAreRequeued(self):
+        lost_at = timezone.now() - timedelta(seconds=settings.JOBS_LEASE_TIMEOUT + 1)
+        job = enqueue(failing_task)
+        models.Job.objects.filter(pk=job.pk).update(status=models.Job.STATUS_RUNNING, attempts=1, started_at=lost_at)
+        exhausted = enqueue(failing_task)
+        models.Job.objects.filter(pk=exhausted.pk).update(
+            status=models.Job.STATUS_RUNNING, attempts=2, started_at=lost_at,
+        )
+        running = enqueue(failing_task)
+        models.Job.objects.filter(pk=running.pk).update(status=models.Job.STATUS_RUNNING, started_at=timezone.now())
+
+        self.assertEqual(requeue_lost_jobs(), 2)
+        statuses = {job.pk: job.status for job in models.Job.objects.all()}
+        self.assertEqual(statuses, {
+            job.pk: models.Job.STATUS_PENDING,
+            exhausted.pk: models.Job.STATUS_FAILED,
+            running.pk: models.Job.STATUS_RUNNING,
+        })
+
+    @patch("django.conf.settings.JOBS_RETRY_DELAY", 0)
+    def test_retries(self):
+        job = enqueue(failing_task)
+        self.assertEqual(run_pending_jobs(), 3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.Job.STATUS_FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("RuntimeError", job.last_error)
@@ -0,0 +1,98 @@
+"""Trending posts: materialized time-decayed like score, see `PostScore` model.
+
+Every like adds 1 to the score of the post and every unlike takes 1 back (the score doesn't
+go below zero, and the post drops out of the table at zero). `decay_scores` background job multiplies all the scores by the same factor
+every `TRENDING_DECAY_INTERVAL` seconds, so a like loses half of its weight in
+`TRENDING_HALF_LIFE` seconds. Posts whose score has decayed below `TRENDING_MIN_SCORE`
+drop out of the table, so it holds only the recently liked posts.
+
+The top posts are read by the index on the score, which costs the same however many likes there are.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from trivio_backend.core import models
+from trivio_backend.core.jobs import enqueue_at, get_func_name, requeue_lost_jobs
+from trivio_backend.core.response_cache import bump_posts_generation
+from trivio_backend.core.sqlite import immediate_atomic, in_chunks
+
+logger = logging.getLogger(__name__)
+
+
+def add_scores(deltas):
+    """Change scores of the posts by `{post_id: delta}` (number of new likes minus unlikes)
+    """
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        existing = set()
+        for post_ids in in_chunks(deltas):
+            existing.update(models.PostScore.objects.filter(post_id__in=post_ids).values_list("post_id", flat=True))
+        posts_by_delta = defaultdict(list)
+        for post_id in existing:
+            posts_by_delta[deltas[post_id]].append(post_id)
+        for delta, delta_post_ids in posts_by_delta.items():
+            for post_ids in in_chunks(delta_post_ids):
+                models.PostScore.objects.filter(post_id__in=post_ids).update(
+                    score=Greatest(F("score") + delta, Value(0.0))
+                )
+        for post_ids in in_chunks(post_id for post_id in existing if deltas[post_id] < 0):
+            models.PostScore.objects.filter(post_id__in=post_ids, score__lte=0).delete()
+        models.PostScore.objects.bulk_create(
+            [
+                models.PostScore(post_id=post_id, score=delta)
+                for post_id, delta in deltas.items()
+                if post_id not in existing and delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def get_trending_posts(queryset, limit):
+    """Posts of `queryset` with the highest score, it's an index scan of `limit` rows
+    """
+    return queryset.filter(score__isnull=False).order_by("-score__score", "-score__post_id")[:limit]
+
+
+def decay_scores(decayed_at):
+    """Background job: decay the scores by the time since `decayed_at` and schedule the next decay
+    """
+    now = timezone.now()
+    elapsed = (now - parse_datetime(decayed_at)).total_seconds()
+    factor = 0.5 ** (max(0.0, elapsed) / settings.TRENDING_HALF_LIFE)
+    with transaction.atomic():
+        models.PostScore.objects.update(score=F("score") * factor)
+        num_dropped, _ = models.PostScore.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+        enqueue_at(
+            now + timedelta(seconds=settings.TRENDING_DECAY_INTERVAL),
+            decay_scores,
+            decayed_at=now.isoformat(),
+        )
+        if num_dropped:
+            bump_posts_generation()
+    logger.info(f"trending scores decayed by {factor:.4f}, {num_dropped} posts dropped")
+
+
+def schedule_decay():
+    """Start the chain of `decay_scores` jobs unless it's already running. Returns True if started
+    """
+    with immediate_atomic():
+        # the job of a crashed worker is either requeued or failed, it doesn't hold the chain up
+        requeue_lost_jobs()
+        scheduled = models.Job.objects.filter(
+            func=get_func_name(decay_scores),
+            status__in=(models.Job.STATUS_PENDING, models.Job.STATUS_RUNNING),
+        ).exists()
+        if not scheduled:
+            now = timezone.now()
+            enqueue_at(now, decay_scores, decayed_at=now.isoformat())
+    return not scheduled
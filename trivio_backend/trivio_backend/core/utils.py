@@ -1,31 +1,300 @@
+import contextlib
 import logging
 import requests
+import requests.adapters
 import requests.exceptions
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
+from django.conf import settings
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 logger = logging.getLogger(__name__)
 
+# scheme://host => requests.Session, shared by all threads of the process
+_sessions = {}
+_sessions_lock = threading.Lock()
+_transport_factory = None
 
-def call_external_api(url, max_attempts=3, timeout=5, retry_interval=0.5, no_retry_status_codes=tuple(), **kwargs):
-    for attempt in range(max_attempts):
+
+def _default_transport():
+    return requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.EXTERNAL_HTTP_POOL_SIZE,
+    )
+
+
+def set_transport_factory(factory):
+    """Use `factory()` to create transport adapters of the new sessions instead of the real HTTP one.
+
+    Allows to plug in a stub transport for tests and benchmarks. `None` resets to the default
+    """
+    global _transport_factory
+    with _sessions_lock:
+        _transport_factory = factory
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _breakers.clear()
+
+
+def _host_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    """Keep-alive session for the host of the url, so connections are reused between calls
+    """
+    key = _host_key(url)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.mount(key, (_transport_factory or _default_transport)())
+            if not settings.EXTERNAL_HTTP_KEEP_ALIVE:
+                session.headers["Connection"] = "close"
+            _sessions[key] = session
+        return session
+
+
+_executor = None
+
+
+def get_external_executor():
+    """Thread pool shared by the concurrent external calls of the process
+    """
+    global _executor
+    with _sessions_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.EXTERNAL_THREAD_POOL_SIZE,
+                thread_name_prefix="external",
+            )
+        return _executor
+
+
+class Deadline:
+    """Time budget shared by several external calls
+    """
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after `failure_threshold` failed calls in a row.
+
+    After `reset_timeout` seconds single probe call is allowed (half-open state),
+    its success closes the breaker, failure opens it again. A probe that never reports
+    back is given up after another `reset_timeout`, so the next call probes again
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0
+        self._probe_started_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout \
+                    or self.state == self.HALF_OPEN and now - self._probe_started_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_started_at = now
+                return True
+            # open, or half-open with the probe in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(f"circuit breaker is open after {self.failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+# scheme://host => CircuitBreaker
+_breakers = {}
+
+
+def get_circuit_breaker(url):
+    key = _host_key(url)
+    with _sessions_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=settings.EXTERNAL_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.EXTERNAL_BREAKER_RESET_TIMEOUT,
+            )
+            _breakers[key] = breaker
+        return breaker
+
+
+def get_circuit_breakers_stats():
+    with _sessions_lock:
+        breakers = dict(_breakers)
+    return {key: breaker.stats() for key, breaker in breakers.items()}
+
+
+def call_external_api(url, max_attempts=3, timeout=5, retry_interval=0.5, no_retry_status_codes=tuple(),
+                      deadline=None, **kwargs):
+    if deadline is not None and deadline.expired:
+        logger.info("deadline is exceeded")
+        return None
+    breaker = get_circuit_breaker(url)
+    if not breaker.allow():
+        logger.info(f"circuit breaker for {url} is open, not calling API")
+        return None
+    # outcome of the whole call for the breaker: only connection errors, timeouts and 5xx mean the upstream
+    # is down, other statuses (e.g. clearbit's 404 for unknown emails) are its normal answers
+    upstream_failed = True
+    try:
+        for attempt in range(max_attempts):
+            attempt_timeout = timeout if deadline is None else min(timeout, deadline.remaining())
+            if attempt_timeout <= 0:
+                logger.info("deadline is exceeded")
+                break
+            upstream_failed = True
+            try:
+                logger.info(f"calling API {url}, attempt {attempt + 1}")
+                r = get_session(url).get(url, timeout=attempt_timeout, **kwargs)
+                upstream_failed = r.status_code >= 500
+                if r.status_code == 200:
+                    logger.info(f"API call successful")
+                    return r.json()
+                logger.info(f"got HTTP {r.status_code}")
+                if r.status_code in no_retry_status_codes:
+                    return {}
+            except requests.exceptions.RequestException:
+                logger.exception('')
+            if attempt + 1 == max_attempts:
+                break
+            logger.info("retrying")
+            time.sleep(retry_interval if deadline is None else min(retry_interval, deadline.remaining()))
+            retry_interval *= 1.5
+        logger.info("giving up to call API")
+        return None
+    finally:
+        # also reached by unexpected exceptions, so a half-open probe always reports back
+        if upstream_failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-item TTL and hit/miss counters
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._items[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+class ReadWriteLock:
+    """Shared lock of many readers or exclusive lock of a single writer.
+
+    A waiting writer stops new readers, so it isn't starved. Not reentrant
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
         try:
-            logger.info(f"calling API {url}, attempt {attempt + 1}")
-            r = requests.get(url, timeout=timeout, **kwargs)
-            if r.status_code == 200:
-                logger.info(f"API call successful")
-                return r.json()
-            logger.info(f"got HTTP {r.status_code}")
-            if r.status_code in no_retry_status_codes:
-                return {}
-        except requests.exceptions.RequestException:
-            logger.exception('')
-        logger.info("retrying")
-        time.sleep(retry_interval)
-        retry_interval *= 1.5
-    logger.info("giving up to call API")
-    return None
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
 
 
 class ReadOnly(BasePermission):
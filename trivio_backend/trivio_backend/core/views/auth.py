@@ -1,32 +1,21 @@
-from django.db.models import Q
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError
 
 from rest_framework import status, response
 from rest_framework.decorators import api_view
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from trivio_backend.core import models
-from trivio_backend.core.external import verify_email, enrich_email
+from trivio_backend.core.external import RE_EMAIL
+from trivio_backend.core.jobs import enqueue
+from trivio_backend.core.sqlite import write_transaction
+from trivio_backend.core.tasks import verify_new_user
 
 
-def update_field_if_empty(obj, field_name, new_value):
-    if new_value and not getattr(obj, field_name):
-        setattr(obj, field_name, new_value)
-
-
-def get_dict_value(root, path):
-    parts = path.split("/")
-    for part in parts:
-        root = root.get(part)
-        if root is None:
-            return None
-    return root
-
-
-def enrich_user(email, user):
-    extra_data = enrich_email(email)
-    update_field_if_empty(user, "first_name", get_dict_value(extra_data, "name/givenName"))
-    update_field_if_empty(user, "last_name", get_dict_value(extra_data, "name/familyName"))
-    update_field_if_empty(user, "location", get_dict_value(extra_data, "location"))
+@write_transaction
+def _create_user(user):
+    user.save(force_insert=True)
+    enqueue(verify_new_user, user_id=user.id)
 
 
 @api_view(["POST"])
@@ -36,6 +25,9 @@ def auth_signup(request):
     Required fields: `email`, `username`, `password`
 
     Optional fields: `first_name`, `last_name`
+
+    Email verification and profile enrichment are done by background job,
+    so new user is in `pending` verification state.
     """
     email = request.data.get("email")
     username = request.data.get("username")
@@ -47,27 +39,32 @@ def auth_signup(request):
     first_name = request.data.get("first_name", '')
     last_name = request.data.get("last_name", '')
 
-    if models.User.objects.filter(Q(username=username) | Q(email=email)).exists():
-        return response.Response({
-            "error": "user with this email or nickname already exists"
-        }, status=status.HTTP_409_CONFLICT)
-    if not verify_email(email):
+    # cheap check only, full verification is done in background
+    if not RE_EMAIL.match(email):
         return response.Response({
             "error": "email is not valid"
         }, status.HTTP_400_BAD_REQUEST)
 
-    user = models.User.objects.create(
+    # hashing is slow by design, so it's done before the write lock is taken
+    user = models.User(
         email=email,
         username=username,
+        password=make_password(password),
         first_name=first_name,
         last_name=last_name,
+        verification_state=models.User.VERIFICATION_PENDING,
     )
-    user.set_password(password)
-    enrich_user(email, user)
-    user.save()
+    try:
+        _create_user(user)
+    except IntegrityError:
+        # unique constraints on username and email, there's no check before the INSERT to race with
+        return response.Response({
+            "error": "user with this email or nickname already exists"
+        }, status=status.HTTP_409_CONFLICT)
     refresh = RefreshToken.for_user(user)
     return response.Response({
         'id': user.id,
+        'verification': user.verification_state,
         'refresh': str(refresh),
         'access': str(refresh.access_token),
     }, status=status.HTTP_201_CREATED)
@@ -0,0 +1,42 @@
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import permissions, response, status
+from rest_framework.decorators import api_view, permission_classes
+
+from trivio_backend.core import export
+
+
+@api_view(["GET"])
+@permission_classes((permissions.IsAdminUser, ))
+def export_rows(request, kind):
+    """Stream all the posts or like edges as NDJSON, ordered by id, see `core.export`.
+
+    Query params for incremental exports: `since_id` (the last exported id) and,
+    for posts only, `since` (ISO timestamp of the last save, likes don't change it).
+    """
+    if kind not in export.KINDS:
+        return response.Response({
+            "error": f"unknown export {kind}, expected one of {', '.join(export.KINDS)}",
+        }, status=status.HTTP_404_NOT_FOUND)
+    since = request.query_params.get("since")
+    since_id = request.query_params.get("since_id")
+    if since is not None:
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            # well formatted, but not a valid date, e.g. the 13th month
+            since = None
+        if since is None or kind != "posts":
+            return response.Response({
+                "error": "`since` must be ISO timestamp, and only posts can be exported by it",
+            }, status=status.HTTP_400_BAD_REQUEST)
+    if since_id is not None:
+        if not since_id.isdigit():
+            return response.Response({
+                "error": "`since_id` must be an integer",
+            }, status=status.HTTP_400_BAD_REQUEST)
+        since_id = int(since_id)
+
+    rows = export.get_rows(kind, since=since, since_id=since_id)
+    return StreamingHttpResponse(export.iter_ndjson(rows), content_type="application/x-ndjson")
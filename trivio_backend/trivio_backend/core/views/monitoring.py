@@ -0,0 +1,34 @@
+from rest_framework import permissions, response
+from rest_framework.decorators import api_view, permission_classes
+
+from trivio_backend.core import response_cache
+from trivio_backend.core.external import get_cache_stats
+from trivio_backend.core.like_buffer import like_buffer
+from trivio_backend.core.utils import get_circuit_breakers_stats
+
+
+@api_view(["GET"])
+@permission_classes((permissions.IsAdminUser, ))
+def external_stats(request):
+    """State of the hunter.io/clearbit circuit breakers and caches
+    """
+    return response.Response({
+        "circuit_breakers": get_circuit_breakers_stats(),
+        "caches": get_cache_stats(),
+    })
+
+
+@api_view(["GET"])
+@permission_classes((permissions.IsAdminUser, ))
+def response_cache_stats(request):
+    """Hit ratios of the post endpoints response cache
+    """
+    return response.Response(response_cache.get_stats())
+
+
+@api_view(["GET"])
+@permission_classes((permissions.IsAdminUser, ))
+def like_buffer_stats(request):
+    """Depth of the write-behind likes buffer and its flushes
+    """
+    return response.Response(like_buffer.stats())
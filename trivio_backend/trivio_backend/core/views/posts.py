@@ -1,34 +1,284 @@
+import hashlib
 import logging
 
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Substr
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
 from rest_framework import status, permissions, serializers, generics, response
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
 
-from trivio_backend.core import models
+from trivio_backend.core import models, response_cache, search, trending
+from trivio_backend.core.like_buffer import like_buffer
+from trivio_backend.core.likes import add_like, remove_like, apply_likes, get_liked_post_ids
+from trivio_backend.core.pagination import KeysetPagination, OffsetPagination, get_limit
+from trivio_backend.core.renderers import MessagePackRenderer
+from trivio_backend.core.sqlite import write_transaction
 from trivio_backend.core.utils import ReadOnly
 
 
 logger = logging.getLogger(__name__)
 
+# the post is changed only with these fields: `timestamp` is updated on every save and `num_likes` on every like
+POST_VERSION_FIELDS = ("id", "timestamp", "num_likes")
+
+_UNKNOWN = object()
+
+
+def get_posts_etag(posts, links=None):
+    """ETag of the posts versions, and of the pagination links of the page if it is one
+    """
+    versions = ";".join(f"{post.id}:{post.timestamp.isoformat()}:{post.num_likes}" for post in posts)
+    if links is not None:
+        versions += "|" + ",".join(str(link) for link in links)
+    return '"' + hashlib.md5(versions.encode()).hexdigest() + '"'
+
+
+def is_etag_matched(request, etag):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    # weak comparison: compressed responses have weak ETags
+    etags = [e[2:] if e.startswith("W/") else e for e in parse_etags(if_none_match)]
+    return "*" in etags or etag in etags
+
+
+def not_modified(etag):
+    return response.Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def get_liked_by_me(request, post_ids):
+    """Which of the posts are liked by the caller, or None for anonymous callers
+    """
+    if not request.user.is_authenticated:
+        return None
+    liked = get_liked_post_ids(request.user.id, post_ids)
+    like_buffer.merge_liked(request.user.id, liked, post_ids)
+    return liked
+
+
+def get_personal_etag(request, etag, liked, deltas):
+    """ETag of the response for the caller: it depends on the `liked_by_me` marks (two callers get
+    the same one only for the same marks), on the likes pending in `like_buffer` and on the representation
+    of the posts: format, fields and excerpt
+    """
+    representation = [
+        request.accepted_renderer.format,
+        request.query_params.get("fields", ""),
+        request.query_params.get("excerpt", ""),
+    ]
+    if liked is None and not deltas and representation == ["json", "", ""]:
+        return etag
+    marks = "" if liked is None else ",".join(str(post_id) for post_id in sorted(liked))
+    pending = ",".join(f"{post_id}:{delta}" for post_id, delta in sorted(deltas.items()))
+    return '"' + hashlib.md5(f"{etag}:{marks}:{pending}:{':'.join(representation)}".encode()).hexdigest() + '"'
+
+
+def get_personal_response(request, etag, data, liked=_UNKNOWN):
+    """Response of the cached (or just serialized) posts with `liked_by_me` for authenticated caller.
+
+    Cached data is shared by all the callers, so the marks are added here with one query per page.
+    So are the likes pending in `like_buffer`: cached data has `num_likes` of the database,
+    it must be called in `like_buffer.reading()` section with the reads of the data
+    """
+    is_list = "results" in data
+    posts_data = data["results"] if is_list else [data]
+    post_ids = [post["id"] for post in posts_data]
+    if liked is _UNKNOWN:
+        liked = get_liked_by_me(request, post_ids)
+    deltas = like_buffer.get_deltas(post_ids)
+    etag = get_personal_etag(request, etag, liked, deltas)
+    if is_etag_matched(request, etag):
+        return not_modified(etag)
+    if deltas and "num_likes" in posts_data[0]:
+        posts_data = [dict(post, num_likes=post["num_likes"] + deltas.get(post["id"], 0)) for post in posts_data]
+    if liked is not None:
+        posts_data = [dict(post, liked_by_me=post["id"] in liked) for post in posts_data]
+    if deltas or liked is not None:
+        data = dict(data, results=posts_data) if is_list else posts_data[0]
+    return response.Response(data, headers={"ETag": etag})
+
 
 class PostSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Post
         fields = ["id", "user", "num_likes", "timestamp", "content", "title"]
+        read_only_fields = ["num_likes"]
 
     user = serializers.PrimaryKeyRelatedField(
         queryset=models.User.objects,
         style={'base_template': 'input.html'},
         required=False
     )
-    num_likes = serializers.SerializerMethodField()
 
-    @staticmethod
-    def get_num_likes(obj):
-        return obj.likes.count()
+
+# columns of the read path, in the order of `PostSerializer` fields
+POST_READ_FIELDS = ("id", "user_id", "num_likes", "timestamp", "content", "title")
+POST_OUTPUT_FIELDS = ("id", "user", "num_likes", "timestamp", "content", "title")
+
+
+class PostRow:
+    """Post read by `values_list(*POST_READ_FIELDS)` (or some of them): much cheaper than the model
+    instance, but it still has the attributes needed for ETags
+    """
+    __slots__ = POST_READ_FIELDS
+
+    def __init__(self, *values, columns=POST_READ_FIELDS):
+        for field, value in zip(columns, values):
+            setattr(self, field, value)
+
+
+def get_post_rows(queryset):
+    return [PostRow(*values) for values in queryset.values_list(*POST_READ_FIELDS)]
+
+
+def get_output_fields(request):
+    """Fields of the posts requested by `fields` query param (comma-separated), `id` is always there
+    """
+    fields = request.query_params.get("fields")
+    if not fields:
+        return POST_OUTPUT_FIELDS
+    fields = {field.strip() for field in fields.split(",")} - {""}
+    unknown = fields - set(POST_OUTPUT_FIELDS)
+    if unknown:
+        raise ParseError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in POST_OUTPUT_FIELDS if field in fields or field == "id")
+
+
+def get_excerpt_length(request):
+    """Max length of the content requested by `excerpt` query param, None for the whole content.
+
+    Lengths beyond the max length of the content are cut to it, SQLite can't take any integer
+    """
+    excerpt = request.query_params.get("excerpt")
+    if excerpt is None:
+        return None
+    try:
+        length = int(excerpt)
+    except ValueError:
+        length = 0
+    if length <= 0:
+        raise ParseError("excerpt must be a positive integer")
+    return min(length, models.Post._meta.get_field("content").max_length)
+
+
+def get_post_values(request, queryset, named=False):
+    """`values_list` of the posts with only the columns of the requested fields (and versions of the posts).
+    With `excerpt`, the content is truncated by the database, so the rest of it isn't even read.
+
+    Returns the values and the columns of `PostRow` for them
+    """
+    fields = get_output_fields(request)
+    excerpt = get_excerpt_length(request)
+    columns = tuple(
+        column for column, field in zip(POST_READ_FIELDS, POST_OUTPUT_FIELDS)
+        if field in fields or column in POST_VERSION_FIELDS
+    )
+    select = list(columns)
+    if excerpt is not None and "content" in columns:
+        queryset = queryset.annotate(content_excerpt=Substr("content", 1, excerpt))
+        select[select.index("content")] = "content_excerpt"
+    return queryset.values_list(*select, named=named), columns
+
+
+_timestamp_field = serializers.DateTimeField()
+# `PostRow` attribute of every output field
+_ROW_ATTRIBUTES = dict(zip(POST_OUTPUT_FIELDS, POST_READ_FIELDS))
+
+
+def _serialize_post_row_fields(row, fields):
+    data = {}
+    for field in fields:
+        value = getattr(row, _ROW_ATTRIBUTES[field])
+        data[field] = _timestamp_field.to_representation(value) if field == "timestamp" else value
+    return data
+
+
+def serialize_post_rows(rows, fields=POST_OUTPUT_FIELDS):
+    """Read-only equivalent of `PostSerializer(many=True)`, with the same output but without
+    the per field and per instance machinery of DRF serializers.
+    `fields` are the output fields, some of `POST_OUTPUT_FIELDS`
+    """
+    if fields != POST_OUTPUT_FIELDS:
+        return [_serialize_post_row_fields(row, fields) for row in rows]
+    to_timestamp = _timestamp_field.to_representation
+    return [
+        {
+            "id": row.id,
+            "user": row.user_id,
+            "num_likes": row.num_likes,
+            "timestamp": to_timestamp(row.timestamp),
+            "content": row.content,
+            "title": row.title,
+        }
+        for row in rows
+    ]
+
+
+class PostRenderersMixin:
+    """JSON or MessagePack (`Accept: application/msgpack`) responses
+    """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, MessagePackRenderer]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ("Accept",))
+        return response
+
+
+class PostListMixin(PostRenderersMixin):
+    """Cursor-paginated posts listing with ETags and response cache
+    """
+    cache_endpoint = "posts_list"
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        with like_buffer.reading():
+            return self._list(request)
+
+    def _list(self, request):
+        cache_key = response_cache.get_key(self.cache_endpoint, request.get_full_path())
+        cached = response_cache.get_cached(self.cache_endpoint, cache_key)
+        if cached is not None:
+            return get_personal_response(request, *cached)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        liked = _UNKNOWN
+        if request.META.get("HTTP_IF_NONE_MATCH"):
+            # check the page version without loading and serializing the posts
+            versions = self.paginate_queryset(queryset.only(*POST_VERSION_FIELDS))
+            post_ids = [post.id for post in versions]
+            liked = get_liked_by_me(request, post_ids)
+            etag = get_personal_etag(
+                request, get_posts_etag(versions, self.paginator.get_links()), liked, like_buffer.get_deltas(post_ids)
+            )
+            if is_etag_matched(request, etag):
+                return not_modified(etag)
+        # named rows, as the paginator reads cursors from them
+        values, columns = get_post_values(request, queryset, named=True)
+        page = [PostRow(*row, columns=columns) for row in self.paginate_queryset(values)]
+        data = serialize_post_rows(page, get_output_fields(request))
+        cached = (get_posts_etag(page, self.paginator.get_links()), self.get_paginated_response(data).data)
+        response_cache.set_cached(cache_key, cached)
+        return get_personal_response(request, *cached, liked=liked)
 
 
-class PostItems(generics.ListCreateAPIView):
+class PostItems(PostListMixin, generics.ListCreateAPIView):
     """Get posts list or create new post
+
+    Listing is paginated by cursor, newest first: use `limit` and the `next`/`previous`
+    cursors from the response as `after`/`before` query params.
+    Posts are marked with `liked_by_me` for authenticated callers.
+    `fields` (comma-separated) limits the fields of the posts, `excerpt` truncates their content to the length.
+
+    Posting a list of posts creates all of them at once (at most `POSTS_BULK_CREATE_MAX_SIZE`)
+    and returns their ids.
     """
     permission_classes = (ReadOnly|permissions.IsAuthenticated, )
     queryset = models.Post.objects
@@ -36,40 +286,223 @@ class PostItems(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        response_cache.bump_posts_generation()
+
+    @write_transaction
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
+        return super().create(request, *args, **kwargs)
+
+    def bulk_create(self, request):
+        """Create all the posts from the list in one transaction, returns ids of created posts
+        """
+        if len(request.data) > settings.POSTS_BULK_CREATE_MAX_SIZE:
+            return response.Response({
+                "error": f"too many posts, at most {settings.POSTS_BULK_CREATE_MAX_SIZE} are allowed",
+            }, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        posts = [
+            models.Post(**dict(data, user=request.user))
+            for data in serializer.validated_data
+        ]
+        with transaction.atomic():
+            models.Post.objects.bulk_create(posts)
+            if connection.features.can_return_ids_from_bulk_insert:
+                ids = [post.id for post in posts]
+            else:
+                # the transaction holds the write lock, so the last ids of the user are the new ones
+                ids = list(
+                    models.Post.objects.filter(user=request.user)
+                    .order_by("-id")
+                    .values_list("id", flat=True)[:len(posts)]
+                )[::-1]
+            response_cache.bump_posts_generation()
+        return response.Response({"ids": ids}, status=status.HTTP_201_CREATED)
+
+
+class UserPostItems(PostListMixin, generics.ListAPIView):
+    """Get posts of the user, paginated the same way as the posts list
+    """
+    cache_endpoint = "user_posts"
+    serializer_class = PostSerializer
+
+    def get_queryset(self):
+        return models.Post.objects.filter(user_id=self.kwargs["pk"])
+
+
+class PostSearch(generics.ListAPIView):
+    """Full-text search of posts by title and content, the most relevant first
+
+    Query params: `q` (all its words must match), `limit` and `offset`.
+    """
+    serializer_class = PostSerializer
+    pagination_class = OffsetPagination
 
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "")
+        if not search.get_words(query):
+            return response.Response({
+                "error": "search query `q` is required",
+            }, status=status.HTTP_400_BAD_REQUEST)
+        values, columns = get_post_values(request, search.search_posts(models.Post.objects, query))
+        with like_buffer.reading():
+            page = [PostRow(*row, columns=columns) for row in self.paginate_queryset(values)]
+            data = self.get_paginated_response(serialize_post_rows(page, get_output_fields(request))).data
+            return get_personal_response(request, get_posts_etag(page, self.paginator.get_links()), data)
 
-class PostItemDetail(generics.RetrieveAPIView):
+
+class TrendingPostItems(generics.ListAPIView):
+    """Get the posts with the highest time-decayed like score, see `core.trending`
+
+    Query params: `limit`.
+    """
+    serializer_class = PostSerializer
+
+    def list(self, request, *args, **kwargs):
+        with like_buffer.reading():
+            cache_key = response_cache.get_key("posts_trending", request.get_full_path())
+            cached = response_cache.get_cached("posts_trending", cache_key)
+            if cached is None:
+                values, columns = get_post_values(request, models.Post.objects)
+                posts = [
+                    PostRow(*row, columns=columns) for row in trending.get_trending_posts(values, get_limit(request))
+                ]
+                cached = (get_posts_etag(posts), {"results": serialize_post_rows(posts, get_output_fields(request))})
+                response_cache.set_cached(cache_key, cached)
+            return get_personal_response(request, *cached)
+
+
+class PostItemDetail(PostRenderersMixin, generics.RetrieveAPIView):
     """Get single post information
+
+    Supports conditional requests: `If-None-Match` with the `ETag` of the previous response.
     """
     queryset = models.Post.objects
     serializer_class = PostSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        with like_buffer.reading():
+            return self._retrieve(request, kwargs["pk"])
 
-@api_view(["POST"])
-@permission_classes((permissions.IsAuthenticated, ))
-def like_post(request, pk):
-    """Unlike the post. Liking post that you have already liked will no effect.
-    Self-liking is not allowed
-    """
-    post = models.Post.objects.get(pk=pk)
-    if post.user == request.user:
+    def _retrieve(self, request, pk):
+        # the cache key and the ETag depend on the version only, so it's all that is read for them
+        versions = self.get_queryset().filter(pk=pk).values_list(*POST_VERSION_FIELDS)
+        version = [PostRow(*row, columns=POST_VERSION_FIELDS) for row in versions]
+        if not version:
+            raise Http404
+        cached = response_cache.get_cached("post_detail", response_cache.get_post_key(version[0]))
+        if cached is not None:
+            return get_personal_response(request, *cached)
+
+        liked = _UNKNOWN
+        if request.META.get("HTTP_IF_NONE_MATCH"):
+            liked = get_liked_by_me(request, [version[0].id])
+            etag = get_personal_etag(request, get_posts_etag(version), liked, like_buffer.get_deltas([version[0].id]))
+            if is_etag_matched(request, etag):
+                return not_modified(etag)
+        posts = get_post_rows(self.get_queryset().filter(pk=pk))
+        if not posts:
+            raise Http404
+        cached = (get_posts_etag(posts), serialize_post_rows(posts)[0])
+        # the post may have changed since the version was read, so the key is of the post read
+        response_cache.set_cached(response_cache.get_post_key(posts[0]), cached)
+        return get_personal_response(request, *cached, liked=liked)
+
+
+@write_transaction
+def _write_like(post, user, like):
+    if like:
+        add_like(post, user)
+    else:
+        remove_like(post, user)
+    return post.num_likes
+
+
+def _set_like(request, pk, like):
+    post = get_object_or_404(models.Post, pk=pk)
+    if like and post.user_id == request.user.id:
         return response.Response({
             "error": "self-liking is not allowed",
         }, status=status.HTTP_400_BAD_REQUEST)
-    post.likes.add(request.user)
+    if settings.LIKES_WRITE_BEHIND:
+        like_buffer.add(post.pk, request.user.id, like)
+        with like_buffer.reading():
+            num_likes = models.Post.objects.values_list("num_likes", flat=True).get(pk=post.pk)
+            num_likes += like_buffer.get_delta(post.pk)
+    else:
+        num_likes = _write_like(post, request.user, like)
     return response.Response({
-        "num_likes": post.likes.count(),
+        "num_likes": num_likes,
     })
 
 
+@api_view(["POST"])
+@permission_classes((permissions.IsAuthenticated, ))
+def like_post(request, pk):
+    """Like the post. Liking post that you have already liked will no effect.
+    Self-liking is not allowed
+    """
+    return _set_like(request, pk, True)
+
+
 @api_view(["POST"])
 @permission_classes((permissions.IsAuthenticated, ))
 def unlike_post(request, pk):
     """Unlike the post. Unliking post that you haven't liked will have no effect
     """
-    post = models.Post.objects.get(pk=pk)
-    post.likes.remove(request.user)
+    return _set_like(request, pk, False)
 
-    return response.Response({
-        "num_likes": post.likes.count(),
-    })
+
+@api_view(["POST"])
+@permission_classes((permissions.IsAuthenticated, ))
+def batch_likes(request):
+    """Like and unlike many posts at once. Body is a list of `{"post_id": <id>, "action": "like"|"unlike"}`,
+    at most `LIKES_BATCH_MAX_SIZE` items. If a post occurs several times, its last action wins.
+    All the actions are applied or none of them: self-liking or unknown post fails the whole batch
+    """
+    items = request.data
+    if not isinstance(items, list) or not items:
+        return response.Response({
+            "error": "list of likes is expected",
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.LIKES_BATCH_MAX_SIZE:
+        return response.Response({
+            "error": f"too many items, at most {settings.LIKES_BATCH_MAX_SIZE} are allowed",
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    actions = {}
+    for item in items:
+        post_id = item.get("post_id") if isinstance(item, dict) else None
+        # bool is a subclass of int, but `true` is not a post id
+        if post_id is None or item.get("action") not in ("like", "unlike") \
+                or not isinstance(post_id, int) or isinstance(post_id, bool):
+            return response.Response({
+                "error": f"bad item {item}",
+            }, status=status.HTTP_400_BAD_REQUEST)
+        actions[item["post_id"]] = item["action"] == "like"
+
+    authors = dict(models.Post.objects.filter(pk__in=list(actions)).values_list("id", "user_id"))
+    unknown_ids = set(actions) - set(authors)
+    if unknown_ids:
+        return response.Response({
+            "error": f"posts not found: {sorted(unknown_ids)}",
+        }, status=status.HTTP_404_NOT_FOUND)
+    if any(like and authors[post_id] == request.user.id for post_id, like in actions.items()):
+        return response.Response({
+            "error": "self-liking is not allowed",
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if settings.LIKES_WRITE_BEHIND:
+        like_buffer.add_many(request.user.id, actions)
+        with like_buffer.reading():
+            num_likes = dict(models.Post.objects.filter(pk__in=list(actions)).values_list("id", "num_likes"))
+            deltas = like_buffer.get_deltas(list(actions))
+        num_likes = {post_id: n + deltas.get(post_id, 0) for post_id, n in num_likes.items()}
+    else:
+        num_likes = write_transaction(apply_likes)(request.user, actions)
+    return response.Response([
+        {"post_id": post_id, "num_likes": num_likes[post_id]}
+        for post_id in actions
+    ])
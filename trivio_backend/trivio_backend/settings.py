@@ -43,12 +43,14 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'trivio_backend.core.authentication.CachedJWTAuthentication',
     ],
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'trivio_backend.core.middleware.CompressionMiddleware',
+    'trivio_backend.core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,11 +85,56 @@ AUTH_USER_MODEL = 'core.User'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 with `BEGIN IMMEDIATE` support, see `core.sqlite`
+        'ENGINE': 'trivio_backend.core.backends.sqlite3',
         'NAME': '/var/db/db.sqlite3',
-    }
+    },
+    # read replica example, enable it with `DATABASE_REPLICAS = ['replica']`
+    # 'replica': {
+    #     'ENGINE': 'trivio_backend.core.backends.sqlite3',
+    #     'NAME': '/var/db/replica.sqlite3',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+# safe requests to these paths read from one of the replicas, see `core.db_routers`
+DATABASE_ROUTERS = ['trivio_backend.core.db_routers.ReadReplicaRouter']
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_PATHS = ('/api/v1/posts/', )
+# seconds after a write during which the client reads from the primary
+DATABASE_STICKY_WINDOW = 5
+DATABASE_STICKY_CACHE_MAX_SIZE = 10000
+
+# pragmas applied to every SQLite connection, see `core.sqlite`
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        # negative value is in KiB
+        'cache_size': -64 * 1024,
+        'busy_timeout': 5000,
+    },
+}
+SQLITE_PROFILE = 'production'
+# retries of the write views failed with "database is locked", and the first delay between them, seconds
+SQLITE_BUSY_RETRIES = 3
+SQLITE_BUSY_RETRY_INTERVAL = 0.05
+
+
+# used by the response cache of the post endpoints, see `core.response_cache`
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+# cached responses expire after this time anyway, a backstop for a missed generation bump, seconds
+RESPONSE_CACHE_TTL = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -157,3 +204,73 @@ STATIC_URL = '/static/'
 EMAIL_HUNTER_API_KEY = None
 
 CLEARBIT_API_KEY = None
+
+# connections kept alive per hunter.io/clearbit host, see `core.utils.get_session`
+EXTERNAL_HTTP_POOL_SIZE = 10
+EXTERNAL_HTTP_KEEP_ALIVE = True
+# threads running hunter.io/clearbit calls concurrently
+EXTERNAL_THREAD_POOL_SIZE = 8
+
+# per-host circuit breaker: failures in a row to open it and seconds before the probe call
+EXTERNAL_BREAKER_FAILURE_THRESHOLD = 5
+EXTERNAL_BREAKER_RESET_TIMEOUT = 30
+# total time budget of the external calls for a single signup, seconds
+SIGNUP_EXTERNAL_DEADLINE = 30
+# verification of the user is rescheduled while hunter.io is unavailable: the first delay (doubled every time)
+# and the maximum one, seconds
+SIGNUP_VERIFICATION_RETRY_DELAY = 60
+SIGNUP_VERIFICATION_RETRY_MAX_DELAY = 3600
+
+# in-process cache of hunter.io/clearbit results, see `core.external`
+EXTERNAL_CACHE_MAX_SIZE = 10000
+EXTERNAL_CACHE_TTL = 24 * 3600
+# for HTTP 400, failed verifications, domains without mail server and empty enrichment data
+EXTERNAL_CACHE_NEGATIVE_TTL = 3600
+EXTERNAL_CACHE_DOMAIN_TTL = 24 * 3600
+# skip hunter.io call for addresses on domains it has reported as webmail or accept-all
+EMAIL_HUNTER_TRUST_DOMAINS = False
+
+# post listing page size (`limit` query param) and its upper bound
+POSTS_PAGE_SIZE = 20
+POSTS_MAX_PAGE_SIZE = 100
+# upper bound of `offset` query param of ranked results (search): deep pages are scanned through
+POSTS_MAX_OFFSET = 10000
+# max number of posts in a single bulk creation request
+POSTS_BULK_CREATE_MAX_SIZE = 1000
+
+# max number of items in a single `posts/likes/` batch
+LIKES_BATCH_MAX_SIZE = 500
+
+# buffer likes in memory and write them by batches, see `core.like_buffer`
+LIKES_WRITE_BEHIND = False
+LIKES_FLUSH_INTERVAL = 1.0
+LIKES_FLUSH_SIZE = 1000
+
+# responses smaller than this (bytes) are sent uncompressed, see `core.middleware.CompressionMiddleware`
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+# 0-11, the default 11 is too slow for responses compressed on the fly
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 4
+
+# rows read and written at once by NDJSON export, see `core.export`
+EXPORT_CHUNK_SIZE = 2000
+
+# rows per transaction of `manage.py import_jsonl`
+IMPORT_BATCH_SIZE = 5000
+
+# trending posts, see `core.trending`: seconds for a like to lose half of its weight,
+# seconds between decays and the score below which the post is not trending anymore
+TRENDING_HALF_LIFE = 6 * 3600
+TRENDING_DECAY_INTERVAL = 600
+TRENDING_MIN_SCORE = 0.01
+
+# background jobs (`manage.py run_jobs`): attempts per job and base delay between them, seconds
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 60
+# seconds after which a running job is considered lost by a crashed worker and is retried,
+# it must be longer than any job runs
+JOBS_LEASE_TIMEOUT = 600
+
+# authenticated users cache, see `core.authentication`
+JWT_USER_CACHE_MAX_SIZE = 10000
+# the cache is per process: deactivation of the user in another process is seen after this time, seconds
+JWT_USER_CACHE_TTL = 10
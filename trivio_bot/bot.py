@@ -78,8 +78,6 @@ class Post:
         self.user = user
 
     def like_by(self, user):
-        response = user.jwt_auth.post(f"/posts/{self.id}/like/")
-        ensure_response_ok(response)
         self.num_likes += 1
         user.num_likes += 1
 
@@ -97,13 +95,25 @@ class User:
     def login(self):
         self.jwt_auth.login()
 
-    def create_post(self, title, content):
-        response = self.jwt_auth.post("/posts/", {
-            "content": content,
-            "title": title
-        })
+    def like_posts(self, posts):
+        response = self.jwt_auth.post("/posts/likes/", [
+            {"post_id": post.id, "action": "like"}
+            for post in posts
+        ])
+        ensure_response_ok(response)
+
+    def create_posts(self, titles_and_contents):
+        response = self.jwt_auth.post("/posts/", [
+            {"content": content, "title": title}
+            for title, content in titles_and_contents
+        ])
         ensure_response_ok(response)
-        return Post(response.json()["id"], self, title)
+        new_posts = [
+            Post(post_id, self, title)
+            for post_id, (title, _) in zip(response.json()["ids"], titles_and_contents)
+        ]
+        self.posts.extend(new_posts)
+        return new_posts
 
     def signup(self, username, email, password):
         response = self.jwt_auth.post("/auth/signup/", {
@@ -152,9 +162,10 @@ def main(config):
             users.append(user)
     logging.info("creating posts")
     for user in users:
-        for i in range(user.target_num_posts - len(user.posts)):
-            mood = random.choice(config["moods"])
-            post = user.create_post(f"Current mood: {mood}", f"{mood}")
+        moods = [random.choice(config["moods"]) for _ in range(user.target_num_posts - len(user.posts))]
+        if not moods:
+            continue
+        for post in user.create_posts([(f"Current mood: {mood}", f"{mood}") for mood in moods]):
             posts.append(post)
             logging.info(f"user {user.username} created post {post.id} with title '{post.title}'")
 
@@ -174,7 +185,10 @@ def main(config):
             post = random.choice(likeable_posts)
             post.like_by(user=user)
             liked_posts.add(post.id)
-            logging.info(f"user {user.username} liked post {post.id}, like {user.num_likes}/{user.target_num_likes}")
+            logging.info(f"user {user.username} likes post {post.id}, like {user.num_likes}/{user.target_num_likes}")
+        if liked_posts:
+            user.like_posts([p for p in posts if p.id in liked_posts])
+            logging.info(f"user {user.username} liked {len(liked_posts)} posts")
     logging.info("done")
 
 